@@ -1,63 +1,370 @@
 import os
-import json
+import re
+import asyncio
+import msgspec
+import math
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache, wraps
 from dotenv import load_dotenv
-import openai
-import dateparser
-from typing import Dict
+from datetime import date
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
 
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
+OPENAI_KEY = os.getenv("OPENAI_API_KEY")
+
+
+# openai and dateparser are imported on first use: dateparser alone loads
+# hundreds of ms of locale data, which otherwise lands on every cold start
+@lru_cache(maxsize=1)
+def _openai_client():
+    """
+    One client per process so the underlying HTTP connection pool is reused
+    across calls instead of opening a new TLS session per request
+    """
+    if not OPENAI_KEY:
+        return None
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(
+        api_key=OPENAI_KEY,
+        timeout=float(os.getenv("API_TIMEOUT", 30)),
+        max_retries=2,
+    )
+
+
+@lru_cache(maxsize=1)
+def _date_parser():
+    """Built once: dateparser loads locale data on every dateparser.parse() call"""
+    from dateparser.date import DateDataParser
+    return DateDataParser(
+        languages=["en", "ar"],
+        # Transactions being logged have already happened ("friday" = last friday)
+        settings={"PREFER_DATES_FROM": "past", "RETURN_AS_TIMEZONE_AWARE": False},
+    )
+
+
+# Cache tuning (same env names as app/config.py)
+CACHE_TTL = int(os.getenv("CACHE_TTL", 3600))
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", 1000))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95))
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+
+CATEGORIES = ["Food", "Shopping", "Bills", "Transport", "Health", "Education", "Entertainment", "Other"]
+
+# Strict structured output: the API only returns objects matching this schema
+TRANSACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "amount": {"type": ["number", "null"]},
+        "category": {"type": "string", "enum": CATEGORIES},
+        "date": {"type": "string", "description": "YYYY-MM-DD"},
+        "description": {"type": "string"},
+    },
+    "required": ["amount", "category", "date", "description"],
+    "additionalProperties": False,
+}
+
+
+class Transaction(msgspec.Struct):
+    """One extraction result, decoded and type-checked straight from the reply"""
+    amount: Optional[float] = None
+    category: str = ""
+    date: str = ""
+    description: str = ""
+
+
+# strict=False also accepts numeric strings such as "20" for amount
+_TRANSACTION_DECODER = msgspec.json.Decoder(Transaction, strict=False)
+
+
+# The user text travels as its own message, so it needs no quoting or escaping
 PROMPT_TEMPLATE = """
-Extract financial transaction details from the following user text.
-Return a strict JSON object only, with keys:
-- amount
-- category (Food, Shopping, Bills, Transport, Health, Education, Entertainment, Other)
-- date (YYYY-MM-DD)
-- description
-
-Now analyse this text:
-"{text}"
+Extract financial transaction details from the user's message.
+Return the amount, the category, the date (YYYY-MM-DD) and a short description.
 """
 
-def call_openai_extract(text: str) -> Dict:
-    prompt = PROMPT_TEMPLATE.format(text=text.replace('"', '\\"'))
-    
-    resp = openai.ChatCompletion.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0
-    )
+def _normalize_key_text(text: str) -> str:
+    return " ".join(text.strip().lower().split())
+
+
+def _numbers_in(text: str) -> Tuple[str, ...]:
+    return tuple(_NUMBER_RE.findall(text))
+
+
+# A unit vector: a numpy array when numpy is installed, else a list
+Vector = Union[List[float], "np.ndarray"]
+
+
+def _unit_vector(vector: List[float]) -> Vector:
+    if HAS_NUMPY:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(array))
+        return array / norm if norm else array
+    norm = math.sqrt(sum(v * v for v in vector))
+    return [v / norm for v in vector] if norm else vector
+
+
+class SemanticEntry(NamedTuple):
+    expires_at: float
+    numbers: Tuple[str, ...]
+    text: str
+    data: Dict
+
+
+class ExtractionCache:
+    """Exact-match + semantic cache for LLM extraction results"""
+
+    def __init__(self, max_size: int = CACHE_MAX_SIZE, ttl: int = CACHE_TTL,
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self._exact: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        # Semantic tier: a ring of max_size slots. Hits must quote the same
+        # numbers, otherwise "coffee 20" would answer for "coffee 25", so
+        # slots are indexed by their numbers and only those are scored.
+        # A slot's vector stays None until a later text with the same numbers
+        # misses; both are then embedded in one call, so a miss with nothing
+        # to compare against costs no embedding call at all. Scoring runs in
+        # a worker thread, hence the lock
+        self._slots: List[Optional[SemanticEntry]] = [None] * max_size
+        self._vectors: List[Optional[Vector]] = [None] * max_size
+        self._by_numbers: Dict[Tuple[str, ...], Set[int]] = {}
+        self._next_slot = 0
+        self._lock = threading.Lock()
 
-    content = resp.choices[0].message["content"].strip()
+    @staticmethod
+    def key_for(text: str) -> str:
+        return hashlib.sha256(_normalize_key_text(text).encode("utf-8")).hexdigest()
 
-    # Try loading JSON
+    def get_exact(self, key: str) -> Optional[Dict]:
+        entry = self._exact.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if time.time() > expires_at:
+            del self._exact[key]
+            return None
+        self._exact.move_to_end(key)
+        return dict(data)
+
+    def _candidates(self, numbers: Tuple[str, ...], now: float) -> List[int]:
+        candidates = []
+        for i in self._by_numbers.get(numbers, ()):
+            entry = self._slots[i]
+            if entry is not None and entry.expires_at >= now:
+                candidates.append(i)
+        return candidates
+
+    def pending_embeddings(self, text: str) -> Optional[List[Tuple[int, SemanticEntry]]]:
+        """
+        Entries get_semantic would compare text against that still need an
+        embedding, or None when there is nothing to compare against
+        """
+        with self._lock:
+            candidates = self._candidates(_numbers_in(text), time.time())
+            if not candidates:
+                return None
+            pending = []
+            for i in candidates:
+                entry = self._slots[i]
+                if entry is not None and self._vectors[i] is None:
+                    pending.append((i, entry))
+            return pending
+
+    def get_semantic(self, text: str, embedding: List[float],
+                     embedded: Sequence[Tuple[int, SemanticEntry, List[float]]] = ()
+                     ) -> Optional[Dict]:
+        """Best entry for text above the threshold, after storing the embeddings
+        fetched for pending_embeddings()"""
+        query = _unit_vector(embedding)
+        with self._lock:
+            for i, entry, vector in embedded:
+                # The slot may have been reused while the embedding was fetched
+                if self._slots[i] is entry:
+                    self._vectors[i] = _unit_vector(vector)
+
+            scored: List[Tuple[int, Vector]] = []
+            for i in self._candidates(_numbers_in(text), time.time()):
+                vector = self._vectors[i]
+                # A changed embedding model leaves older vectors incomparable
+                if vector is not None and len(vector) == len(query):
+                    scored.append((i, vector))
+            if not scored:
+                return None
+
+            if HAS_NUMPY:
+                scores = np.stack([vector for _, vector in scored]) @ query
+                best = int(scores.argmax())
+                best_score, best_slot = float(scores[best]), scored[best][0]
+            else:
+                best_score, best_slot = max(
+                    (sum(q * v for q, v in zip(query, vector)), i)
+                    for i, vector in scored
+                )
+            entry = self._slots[best_slot]
+            if entry is not None and best_score >= self.threshold:
+                return dict(entry.data)
+        return None
+
+    def set(self, key: str, data: Dict, text: Optional[str] = None,
+            embedding: Optional[List[float]] = None) -> None:
+        expires_at = time.time() + self.ttl
+        self._exact[key] = (expires_at, dict(data))
+        self._exact.move_to_end(key)
+        while len(self._exact) > self.max_size:
+            self._exact.popitem(last=False)
+        if text is not None and self.max_size:
+            entry = SemanticEntry(expires_at, _numbers_in(text), text, dict(data))
+            vector = _unit_vector(embedding) if embedding is not None else None
+            self._set_semantic(entry, vector)
+
+    def _set_semantic(self, entry: SemanticEntry, vector: Optional[Vector]) -> None:
+        with self._lock:
+            slot = self._next_slot
+            self._next_slot = (slot + 1) % self.max_size
+            old = self._slots[slot]
+            if old is not None:
+                self._by_numbers[old.numbers].discard(slot)
+                if not self._by_numbers[old.numbers]:
+                    del self._by_numbers[old.numbers]
+            self._slots[slot] = entry
+            self._vectors[slot] = vector
+            self._by_numbers.setdefault(entry.numbers, set()).add(slot)
+
+    def clear(self) -> None:
+        self._exact.clear()
+        with self._lock:
+            self._slots = [None] * self.max_size
+            self._vectors = [None] * self.max_size
+            self._by_numbers.clear()
+            self._next_slot = 0
+
+
+extraction_cache = ExtractionCache()
+
+
+async def _embed(texts: List[str]) -> Optional[List[List[float]]]:
+    """Embeddings for the semantic tier; a failure only disables that tier"""
+    client = _openai_client()
+    if client is None:
+        return None
     try:
-        data = json.loads(content)
-    except:
-        start = content.find('{')
-        end = content.rfind('}')
-        json_text = content[start:end+1]
-        data = json.loads(json_text)
-
-    # Normalize amount
+        resp = await client.embeddings.create(
+            model=EMBEDDING_MODEL, input=[_normalize_key_text(text) for text in texts]
+        )
+        return [item.embedding for item in resp.data]
+    except Exception:
+        return None
+
+
+def cached_extraction(func):
+    """Serve repeated and near-duplicate texts without calling the LLM"""
+    @wraps(func)
+    async def wrapper(text: str) -> Dict:
+        key = ExtractionCache.key_for(text)
+        cached = extraction_cache.get_exact(key)
+        if cached is not None:
+            return cached
+
+        # Embed only when an earlier text quoted the same numbers: this text
+        # and whichever of those entries have no vector yet, in one call
+        embedding = None
+        pending = extraction_cache.pending_embeddings(text)
+        if pending is not None:
+            embeddings = await _embed([text] + [entry.text for _, entry in pending])
+            if embeddings is not None:
+                embedding = embeddings[0]
+                embedded = [(i, entry, vector)
+                            for (i, entry), vector in zip(pending, embeddings[1:])]
+                cached = await asyncio.to_thread(
+                    extraction_cache.get_semantic, text, embedding, embedded
+                )
+                if cached is not None:
+                    extraction_cache.set(key, cached)
+                    return cached
+
+        data = await func(text)
+        extraction_cache.set(key, data, text, embedding)
+        return data
+    return wrapper
+
+
+def _normalize_date(raw) -> Optional[str]:
+    """YYYY-MM-DD for the model's date, or None if dateparser is needed"""
+    if not isinstance(raw, str) or not raw.strip():
+        return date.today().isoformat()
+
+    # The prompt asks for YYYY-MM-DD, so this is the common case
     try:
-        data["amount"] = float(data.get("amount"))
-    except:
-        data["amount"] = None
+        return date.fromisoformat(raw.strip()).isoformat()
+    except ValueError:
+        return None
+
+
+def _parse_date(raw: str) -> str:
+    """Free-form date via dateparser, defaulting to today"""
+    parsed = _date_parser().get_date_data(raw).date_obj
+    return parsed.strftime("%Y-%m-%d") if parsed else date.today().isoformat()
+
+
+async def _complete_json(instructions: str, content: str, name: str, schema: Dict,
+                         decoder: msgspec.json.Decoder):
+    client = _openai_client()
+    if client is None:
+        raise RuntimeError("OPENAI_API_KEY is not configured")
+
+    resp = await client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": instructions},
+            {"role": "user", "content": content},
+        ],
+        temperature=0,
+        seed=0,
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": name, "schema": schema, "strict": True},
+        },
+    )
+
+    return decoder.decode(resp.choices[0].message.content)
+
+
+async def _extract_one(text: str) -> Transaction:
+    return await _complete_json(
+        PROMPT_TEMPLATE, text, "transaction", TRANSACTION_SCHEMA, _TRANSACTION_DECODER
+    )
+
 
-    # Normalize date
-    parsed = dateparser.parse(data.get("date"))
-    if parsed:
-        data["date"] = parsed.strftime("%Y-%m-%d")
-    else:
-        data["date"] = dateparser.parse("today").strftime("%Y-%m-%d")
+@cached_extraction
+async def _extract_cached(text: str) -> Dict:
+    """Model output as returned; the date stays raw so cached "today" or
+    "yesterday" is resolved against the day it is served, not stored"""
+    txn = await _extract_one(text)
+    return {
+        "amount": txn.amount,
+        "category": txn.category or "Other",
+        "date": txn.date,
+        "description": txn.description or text[:80],
+    }
 
-    # Defaults
-    if not data.get("category"):
-        data["category"] = "Other"
 
-    if not data.get("description"):
-        data["description"] = text[:80]
+async def call_openai_extract(text: str) -> Dict:
+    data = await _extract_cached(text)
 
+    # Normalize date; dateparser is CPU-heavy, so keep it off the event loop
+    raw = data["date"]
+    data["date"] = _normalize_date(raw) or await asyncio.to_thread(_parse_date, raw)
     return data
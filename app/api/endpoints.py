@@ -2,25 +2,24 @@
 API endpoints for the Finance Analyzer
 """
 import time
-from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from app.models.requests import TextInput
 from app.models.responses import (
     TextAnalysisResponse, VoiceAnalysisResponse, HealthResponse,
-    SuccessResponse, ErrorResponse, ErrorDetail, TextAnalysisData, VoiceAnalysisData
+    TextAnalysisData, VoiceAnalysisData
 )
 from app.services.nlp_service import NLPService
 from app.services.audio_service import audio_processor
 from app.services.transcription_service import transcription_service
 from app.core.security import check_rate_limit, SecurityUtils
-from app.core.logging import get_logger, log_request, log_error
+from app.core.logging import get_logger
 from app.utils.file_utils import file_handler, validate_file_extension, get_file_info
-from app.utils.cache import get_content_hash
-from app.config import settings
+from app.config import settings, MAX_FILE_SIZE, ALLOWED_AUDIO_EXTENSIONS, RATE_LIMIT_REQUESTS
 from app.exceptions import (
-    ValidationError, AudioProcessingError, TranscriptionError, 
-    FileValidationError, NLPProcessingError
+    FinanceAnalyzerError, ValidationError, TranscriptionError,
+    NLPProcessingError, InternalError
 )
 
 logger = get_logger("api")
@@ -64,11 +63,9 @@ async def analyze_text(request: Request, input_data: TextInput):
     Returns:
         TextAnalysisResponse with extracted financial data
     """
-    start_time = time.time()
-    
     try:
         # Rate limiting
-        check_rate_limit(request, limit=settings.rate_limit_requests, window=60)
+        await check_rate_limit(request, limit=RATE_LIMIT_REQUESTS, window=60)
         
         logger.info(f"Text analysis request: {input_data.text[:50]}...")
         
@@ -88,45 +85,17 @@ async def analyze_text(request: Request, input_data: TextInput):
             analysis=analysis_result
         )
         
-        # Log successful request
-        duration_ms = (time.time() - start_time) * 1000
-        log_request(logger, "POST", "/analyze", 
-                   request.client.host if request.client else "unknown", 
-                   duration_ms, 200)
-        
         return TextAnalysisResponse(
             data=response_data,
             message="Text analysis completed successfully"
         )
-        
-    except ValidationError as e:
-        logger.warning(f"Validation error: {e.message}")
-        raise HTTPException(
-            status_code=400,
-            detail={
-                "error": "validation_error",
-                "message": e.message,
-                "field": e.field
-            }
-        )
-    except NLPProcessingError as e:
-        log_error(logger, e, {"text_length": len(input_data.text)})
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "error": "processing_error",
-                "message": "Failed to analyze text. Please try again."
-            }
-        )
+    
+    except (FinanceAnalyzerError, HTTPException):
+        raise
     except Exception as e:
-        log_error(logger, e, {"endpoint": "/analyze"})
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "error": "internal_error",
-                "message": "An unexpected error occurred"
-            }
-        )
+        # Translate here so the error handler, which runs inside the request
+        # middleware, still stamps the request ID and security headers
+        raise InternalError() from e
 
 
 @router.post("/voice", response_model=VoiceAnalysisResponse)
@@ -136,47 +105,34 @@ async def analyze_voice(request: Request, file: UploadFile = File(...)):
     
     Args:
         file: Audio file upload (wav, mp3, m4a, ogg, webm, flac)
-        
+    
     Returns:
         VoiceAnalysisResponse with transcription and extracted financial data
     """
-    start_time = time.time()
-    
     try:
         # Stricter rate limiting for voice endpoint
-        check_rate_limit(request, limit=5, window=60)
+        await check_rate_limit(request, limit=5, window=60)
         
         # Validate file
         if not file.filename:
             raise ValidationError("No file provided", field="file")
         
-        if not validate_file_extension(file.filename, settings.allowed_audio_extensions):
+        if not validate_file_extension(file.filename, ALLOWED_AUDIO_EXTENSIONS):
             raise ValidationError(
-                f"Invalid file type. Allowed: {', '.join(settings.allowed_audio_extensions)}",
+                f"Invalid file type. Allowed: {', '.join(sorted(ALLOWED_AUDIO_EXTENSIONS))}",
                 field="file"
             )
         
         logger.info(f"Voice analysis request: {file.filename}")
         
-        # Read file content
-        content = await file.read()
-        
-        # Validate file size
-        if not SecurityUtils.validate_file_size(content, settings.max_file_size):
-            raise ValidationError(
-                f"File too large. Maximum size: {settings.max_file_size / 1024 / 1024}MB",
-                field="file"
-            )
-        
-        # Get file info for logging
-        file_info = get_file_info(content, file.filename)
-        logger.info(f"Processing audio file: {file_info}")
-        
-        # Generate content hash for caching
-        content_hash = get_content_hash(content)
-        
-        # Process audio file securely
-        async with file_handler.create_temp_file(content, file.filename) as temp_path:
+        # Stream upload to a secure temp file (size-checked and hashed on the way)
+        async with file_handler.create_temp_file_from_upload(
+            file, MAX_FILE_SIZE
+        ) as (temp_path, file_size, content_hash):
+            # Get file info for logging
+            file_info = get_file_info(file_size, file.filename)
+            logger.info(f"Processing audio file: {file_info}")
+            
             # Process audio
             wav_path, duration = await audio_processor.process_audio_file(temp_path)
             
@@ -198,7 +154,11 @@ async def analyze_voice(request: Request, file: UploadFile = File(...)):
                     raise TranscriptionError("Transcription quality too low")
                 
                 # Analyze transcription
-                analysis_result = await nlp_service.analyze_text(transcription)
+                try:
+                    analysis_result = await nlp_service.analyze_text(transcription)
+                except NLPProcessingError as e:
+                    e.public_message = "Failed to analyze transcription"
+                    raise
                 
                 # Prepare response data
                 response_data = VoiceAnalysisData(
@@ -209,74 +169,16 @@ async def analyze_voice(request: Request, file: UploadFile = File(...)):
                     analysis=analysis_result
                 )
                 
-                # Log successful request
-                duration_ms = (time.time() - start_time) * 1000
-                log_request(logger, "POST", "/voice", 
-                           request.client.host if request.client else "unknown", 
-                           duration_ms, 200)
-                
                 return VoiceAnalysisResponse(
                     data=response_data,
                     message="Voice analysis completed successfully"
                 )
-                
+            
             finally:
                 # Cleanup WAV file
                 await file_handler.cleanup_file(wav_path)
     
-    except ValidationError as e:
-        logger.warning(f"Validation error: {e.message}")
-        raise HTTPException(
-            status_code=400,
-            detail={
-                "error": "validation_error",
-                "message": e.message,
-                "field": e.field
-            }
-        )
-    except FileValidationError as e:
-        logger.warning(f"File validation error: {e.message}")
-        raise HTTPException(
-            status_code=400,
-            detail={
-                "error": "file_validation_error",
-                "message": e.message,
-                "filename": e.filename
-            }
-        )
-    except AudioProcessingError as e:
-        log_error(logger, e, {"filename": file.filename})
-        raise HTTPException(
-            status_code=400,
-            detail={
-                "error": "audio_processing_error",
-                "message": "Failed to process audio file"
-            }
-        )
-    except TranscriptionError as e:
-        log_error(logger, e, {"filename": file.filename})
-        raise HTTPException(
-            status_code=400,
-            detail={
-                "error": "transcription_error",
-                "message": "Failed to transcribe audio"
-            }
-        )
-    except NLPProcessingError as e:
-        log_error(logger, e, {"filename": file.filename})
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "error": "processing_error",
-                "message": "Failed to analyze transcription"
-            }
-        )
+    except (FinanceAnalyzerError, HTTPException):
+        raise
     except Exception as e:
-        log_error(logger, e, {"endpoint": "/voice", "filename": file.filename})
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "error": "internal_error",
-                "message": "An unexpected error occurred"
-            }
-        )
\ No newline at end of file
+        raise InternalError() from e
@@ -2,7 +2,9 @@
 Configuration settings for the Finance Analyzer application
 """
 import os
-from typing import Set, List
+import re
+from functools import cached_property
+from typing import Final, FrozenSet, Set, List, Optional, Tuple
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
@@ -47,6 +49,7 @@ class Settings(BaseSettings):
     rate_limit_requests: int = Field(default=60, env="RATE_LIMIT_REQUESTS")
     rate_limit_window: str = Field(default="1/minute", env="RATE_LIMIT_WINDOW")
     voice_rate_limit: str = Field(default="5/minute", env="VOICE_RATE_LIMIT")
+    redis_url: Optional[str] = Field(default=None, env="REDIS_URL")  # shared limits across workers
     
     # Cache Configuration
     cache_ttl: int = Field(default=3600, env="CACHE_TTL")  # 1 hour
@@ -55,7 +58,7 @@ class Settings(BaseSettings):
     # Database (for future use)
     database_url: str = Field(default="sqlite:///./finance_analyzer.db", env="DATABASE_URL")
     
-    @property
+    @cached_property
     def cors_origins_list(self) -> List[str]:
         """Convert CORS origins string to list"""
         return [origin.strip() for origin in self.cors_origins.split(",")]
@@ -68,6 +71,12 @@ class Settings(BaseSettings):
 # Global settings instance
 settings = Settings()
 
+# Values read on every request, frozen once so hot paths skip settings lookups
+MAX_FILE_SIZE: Final[int] = settings.max_file_size
+ALLOWED_AUDIO_EXTENSIONS: Final[FrozenSet[str]] = frozenset(settings.allowed_audio_extensions)
+CORS_ORIGINS: Final[Tuple[str, ...]] = tuple(settings.cors_origins_list)
+RATE_LIMIT_REQUESTS: Final[int] = settings.rate_limit_requests
+
 # Constants
 CURRENCY_PATTERNS = [
     r'(\d+(?:[,.]?\d+)?)\s*(?:جنيه|جنية|جنيهات)',
@@ -86,4 +95,8 @@ EXPENSE_KEYWORDS = [
     'دفعت', 'اشتريت', 'صرفت', 'خلصت', 'جبت', 'اخدت', 'شريت', 'اشتري',
     'paid', 'bought', 'spent', 'purchase', 'pay', 'دفع', 'شراء', 'حولت',
     'سددت', 'خلصت فلوس', 'كلت', 'شربت'
-]
\ No newline at end of file
+]
+
+# All currency patterns as one alternation (one scan); the amount is the
+# first non-empty group of a match
+CURRENCY_RE = re.compile('|'.join(f'(?:{pattern})' for pattern in CURRENCY_PATTERNS))
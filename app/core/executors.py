@@ -0,0 +1,16 @@
+"""
+Shared thread pool for blocking work
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Blocking jobs here wait on ffmpeg subprocesses rather than holding the
+# GIL, so one pool at twice the core count serves every service
+io_executor = ThreadPoolExecutor(
+    max_workers=(os.cpu_count() or 4) * 2, thread_name_prefix="io"
+)
+
+
+def shutdown_executors():
+    """Wait for running jobs and stop the shared pool"""
+    io_executor.shutdown(wait=True)
@@ -1,20 +1,44 @@
 """
 Logging configuration and utilities
 """
+import copy
 import logging
+import queue
 import sys
-from datetime import datetime
-from typing import Dict, Any
-import json
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+import orjson
 from app.config import settings
 
 
+# Request-scoped fields, set once at the request boundary by the middleware
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+client_ip_var: ContextVar[Optional[str]] = ContextVar("client_ip", default=None)
+
+# Attributes every LogRecord has; anything else on a record came from extra=
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request's ID and client IP to every record"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        request_id = request_id_var.get()
+        if request_id is not None:
+            record.request_id = request_id
+            record.client_ip = client_ip_var.get()
+        return True
+
+
 class JSONFormatter(logging.Formatter):
     """JSON formatter for structured logging"""
     
     def format(self, record: logging.LogRecord) -> str:
         log_entry = {
-            "timestamp": datetime.utcnow().isoformat(),
+            # Time the record was created, not when the listener thread got to it
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -27,15 +51,34 @@ class JSONFormatter(logging.Formatter):
         if record.exc_info:
             log_entry["exception"] = self.formatException(record.exc_info)
         
-        # Add extra fields
-        if hasattr(record, 'extra'):
-            log_entry.update(record.extra)
+        # Add extra fields (logging sets them as record attributes)
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                log_entry[key] = value
         
-        return json.dumps(log_entry, ensure_ascii=False)
+        return orjson.dumps(log_entry, default=str, option=orjson.OPT_UTC_Z).decode()
+
+
+class _InProcessQueueHandler(QueueHandler):
+    """Queue handler that keeps records intact for a same-process listener"""
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock prepare() pre-formats the message and drops exc_info, which
+        # would lose the structured fields JSONFormatter emits. Records never
+        # leave the process, so only the lazy %-args are rendered here.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+# Listener thread that does the actual console/file I/O
+_queue_listener: Optional[QueueListener] = None
 
 
 def setup_logging():
     """Setup application logging"""
+    global _queue_listener
     
     # Create logger
     logger = logging.getLogger("finance_analyzer")
@@ -44,6 +87,7 @@ def setup_logging():
     # Remove existing handlers
     for handler in logger.handlers[:]:
         logger.removeHandler(handler)
+    shutdown_logging()
     
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
@@ -58,12 +102,25 @@ def setup_logging():
         formatter = JSONFormatter()
     
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
     
     # File handler
-    file_handler = logging.FileHandler('app.log')
+    file_handler = RotatingFileHandler(
+        'app.log', maxBytes=50 * 1024 * 1024, backupCount=5, encoding='utf-8'
+    )
     file_handler.setFormatter(JSONFormatter())
-    logger.addHandler(file_handler)
+    
+    # Request handlers only enqueue records; the listener thread writes them
+    log_queue: queue.Queue = queue.Queue(-1)
+    _queue_listener = QueueListener(
+        log_queue, console_handler, file_handler, respect_handler_level=True
+    )
+    _queue_listener.start()
+    
+    # The filter runs in the caller, before the record is enqueued, so the
+    # request's contextvars are still visible; the listener thread can't see them
+    queue_handler = _InProcessQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    logger.addHandler(queue_handler)
     
     # Set third-party loggers to WARNING
     logging.getLogger("uvicorn").setLevel(logging.WARNING)
@@ -72,20 +129,35 @@ def setup_logging():
     return logger
 
 
+def shutdown_logging():
+    """Flush queued records and stop the logging listener thread"""
+    global _queue_listener
+    
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
 def get_logger(name: str) -> logging.Logger:
     """Get logger instance"""
     return logging.getLogger(f"finance_analyzer.{name}")
 
 
 def log_request(logger: logging.Logger, method: str, path: str, 
-                client_ip: str, duration_ms: float, status_code: int):
+                client_ip: str, duration_ms: float, status_code: int,
+                user_agent: str = ""):
     """Log HTTP request"""
+    # Skip building the record entirely when INFO is filtered out
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    
     logger.info(
         "HTTP request completed",
         extra={
             "method": method,
             "path": path,
             "client_ip": client_ip,
+            "user_agent": user_agent,
             "duration_ms": duration_ms,
             "status_code": status_code,
             "type": "http_request"
@@ -1,45 +1,81 @@
 """
 Security utilities and middleware
 """
+import os
 import hashlib
 import secrets
-import bleach
-from typing import Optional
+import re
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
 from fastapi import Request, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.datastructures import Headers
+from starlette.types import Scope
+from app.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("security")
 
 # Try to import magic, but make it optional for Windows compatibility
 try:
     import magic
+    # One shared detector; python-magic serializes calls on it internally
+    _MAGIC = magic.Magic(mime=True)
     HAS_MAGIC = True
 except ImportError:
+    _MAGIC = None
     HAS_MAGIC = False
 
+# Try to import redis; without it rate limits are tracked per process
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+_ALLOWED_AUDIO_MIMES = frozenset({
+    'audio/wav', 'audio/wave', 'audio/x-wav',
+    'audio/mpeg', 'audio/mp3',
+    'audio/mp4', 'audio/m4a',
+    'audio/ogg', 'audio/vorbis',
+    'audio/webm',
+    'audio/flac', 'audio/x-flac'
+})
+_ALLOWED_AUDIO_EXTENSIONS = frozenset({'.wav', '.mp3', '.m4a', '.ogg', '.webm', '.flac'})
+
+# Tags (anything bleach's tokenizer would treat as markup) and control characters
+# other than newline/tab, stripped in a single pass
+_STRIP_RE = re.compile(r'<[A-Za-z/!?][^>]*>|[\x00-\x08\x0b-\x1f]')
+# Leftover markup characters are escaped; existing entities are kept as-is
+_ESCAPE_RE = re.compile(r'&(?!#?\w+;)|[<>]')
+_ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;'}
+
 
 class SecurityUtils:
     """Security utility functions"""
     
+    # Leading bytes needed to identify an audio container
+    MAGIC_HEADER_SIZE = 4096
+    
     @staticmethod
     def sanitize_text(text: str) -> str:
         """Sanitize text input to prevent XSS and injection attacks"""
         if not text:
             return ""
         
-        # Remove HTML tags and dangerous characters
-        clean_text = bleach.clean(text, tags=[], strip=True)
+        # Remove HTML tags and control characters except newlines and tabs
+        clean_text = _STRIP_RE.sub('', text)
         
-        # Remove control characters except newlines and tabs
-        clean_text = ''.join(
-            char for char in clean_text 
-            if ord(char) >= 32 or char in '\n\t'
-        )
+        # Escape remaining markup characters
+        clean_text = _ESCAPE_RE.sub(lambda m: _ESCAPES[m.group()], clean_text)
         
         return clean_text.strip()
     
     @staticmethod
     def generate_secure_filename(original_filename: str) -> str:
         """Generate a secure filename with random component"""
-        import os
         name, ext = os.path.splitext(original_filename)
         secure_name = f"{secrets.token_hex(16)}{ext}"
         return secure_name
@@ -50,20 +86,27 @@ class SecurityUtils:
         return hashlib.sha256(text.encode('utf-8')).hexdigest()
     
     @staticmethod
-    def validate_audio_file_content(content: bytes, filename: str) -> bool:
-        """Validate audio file content using magic bytes"""
+    def validate_audio_file_content(content: bytes, filename: str,
+                                    size: Optional[int] = None) -> bool:
+        """
+        Validate audio file content using magic bytes
+        
+        `content` may be just the leading bytes of the file, in which case
+        `size` gives the full file size.
+        """
+        if size is None:
+            size = len(content)
+        
         if not HAS_MAGIC:
             # Fallback validation using file extension and basic checks
-            import os
             ext = os.path.splitext(filename)[1].lower()
-            allowed_extensions = {'.wav', '.mp3', '.m4a', '.ogg', '.webm', '.flac'}
             
             # Basic content validation
-            if ext not in allowed_extensions:
+            if ext not in _ALLOWED_AUDIO_EXTENSIONS:
                 return False
             
             # Check minimum file size (at least 1KB)
-            if len(content) < 1024:
+            if size < 1024:
                 return False
             
             # Basic magic byte checks for common formats
@@ -75,18 +118,10 @@ class SecurityUtils:
             return True
         
         try:
-            # Check file signature/magic bytes
-            file_type = magic.from_buffer(content, mime=True)
-            allowed_mimes = {
-                'audio/wav', 'audio/wave', 'audio/x-wav',
-                'audio/mpeg', 'audio/mp3',
-                'audio/mp4', 'audio/m4a',
-                'audio/ogg', 'audio/vorbis',
-                'audio/webm',
-                'audio/flac', 'audio/x-flac'
-            }
+            # Check file signature/magic bytes; libmagic only needs the header
+            file_type = _MAGIC.from_buffer(content[:SecurityUtils.MAGIC_HEADER_SIZE])
             
-            return file_type in allowed_mimes
+            return file_type in _ALLOWED_AUDIO_MIMES
         except Exception:
             return False
     
@@ -97,55 +132,132 @@ class SecurityUtils:
 
 
 class RateLimitMiddleware:
-    """Simple in-memory rate limiting middleware"""
+    """Simple in-memory sliding-window rate limiting middleware"""
     
-    def __init__(self):
-        self.requests = {}  # In production, use Redis
+    def __init__(self, sweep_interval: float = 60.0):
+        # (client_ip, limit, window) -> timestamps inside the window; per process,
+        # so multi-worker deployments should set REDIS_URL
+        self.requests: Dict[Tuple[str, int, int], Deque[float]] = {}
+        self.sweep_interval = sweep_interval
+        self._last_sweep = time.monotonic()
     
     def is_rate_limited(self, client_ip: str, limit: int, window: int) -> bool:
         """Check if client is rate limited"""
-        import time
+        current_time = time.monotonic()
         
-        current_time = time.time()
-        client_requests = self.requests.get(client_ip, [])
+        if current_time - self._last_sweep >= self.sweep_interval:
+            self._sweep(current_time)
         
-        # Remove old requests outside the window
-        client_requests = [req_time for req_time in client_requests 
-                          if current_time - req_time < window]
+        key = (client_ip, limit, window)
+        client_requests = self.requests.get(key)
+        if client_requests is None:
+            client_requests = self.requests[key] = deque(maxlen=limit)
+        
+        # Drop requests that slid out of the window
+        while client_requests and current_time - client_requests[0] >= window:
+            client_requests.popleft()
         
         if len(client_requests) >= limit:
             return True
         
         # Add current request
         client_requests.append(current_time)
-        self.requests[client_ip] = client_requests
         
         return False
+    
+    def _sweep(self, current_time: float):
+        """Forget clients whose newest request is already outside the window"""
+        stale_keys = [
+            key for key, client_requests in self.requests.items()
+            if not client_requests or current_time - client_requests[-1] >= key[2]
+        ]
+        for key in stale_keys:
+            del self.requests[key]
+        
+        self._last_sweep = current_time
+
+
+# Sliding window in one round trip: drop expired hits, count, record if under the limit
+_SLIDING_WINDOW_LUA = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, ARGV[2] - ARGV[3])
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+    return 1
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 0
+"""
 
 
-# Global rate limiter instance
+class RedisRateLimiter:
+    """Sliding-window rate limiting shared by all workers through Redis"""
+    
+    def __init__(self, url: str, fallback: RateLimitMiddleware):
+        self.client = aioredis.from_url(url)
+        self._script = self.client.register_script(_SLIDING_WINDOW_LUA)
+        # Used while Redis is unreachable, so an outage never blocks requests
+        self.fallback = fallback
+    
+    async def is_rate_limited(self, client_ip: str, limit: int, window: int) -> bool:
+        """Check if client is rate limited"""
+        current_time = time.time()
+        try:
+            limited = await self._script(
+                keys=[f"ratelimit:{client_ip}:{limit}:{window}"],
+                args=[limit, current_time, window, f"{current_time}:{secrets.token_hex(4)}"]
+            )
+            return bool(limited)
+        except RedisError as e:
+            logger.warning(f"Redis rate limiting unavailable, using in-memory limits: {e}")
+            return self.fallback.is_rate_limited(client_ip, limit, window)
+    
+    async def close(self):
+        """Close the Redis connection pool"""
+        await self.client.aclose()
+
+
+# Global rate limiter instances
 rate_limiter = RateLimitMiddleware()
+redis_rate_limiter = (
+    RedisRateLimiter(settings.redis_url, rate_limiter)
+    if HAS_REDIS and settings.redis_url else None
+)
 
 
-def get_client_ip(request: Request) -> str:
-    """Extract client IP from request"""
+def client_ip_from_scope(scope: Scope, headers: Optional[Headers] = None) -> str:
+    """Extract client IP from an ASGI scope"""
+    if headers is None:
+        headers = Headers(scope=scope)
+    
     # Check for forwarded headers (when behind proxy)
-    forwarded_for = request.headers.get("X-Forwarded-For")
+    forwarded_for = headers.get("X-Forwarded-For")
     if forwarded_for:
         return forwarded_for.split(",")[0].strip()
     
-    real_ip = request.headers.get("X-Real-IP")
+    real_ip = headers.get("X-Real-IP")
     if real_ip:
         return real_ip
     
-    return request.client.host if request.client else "unknown"
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
 
+def get_client_ip(request: Request) -> str:
+    """Extract client IP from request"""
+    return client_ip_from_scope(request.scope, request.headers)
 
-def check_rate_limit(request: Request, limit: int = 60, window: int = 60):
+
+async def check_rate_limit(request: Request, limit: int = 60, window: int = 60):
     """Check rate limit for request"""
-    client_ip = get_client_ip(request)
+    # CombinedRequestMiddleware already resolved the client IP
+    client_ip = getattr(request.state, "client_ip", None) or get_client_ip(request)
+    
+    if redis_rate_limiter is not None:
+        limited = await redis_rate_limiter.is_rate_limited(client_ip, limit, window)
+    else:
+        limited = rate_limiter.is_rate_limited(client_ip, limit, window)
     
-    if rate_limiter.is_rate_limited(client_ip, limit, window):
+    if limited:
         raise HTTPException(
             status_code=429,
             detail={
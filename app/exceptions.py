@@ -7,6 +7,9 @@ from typing import Optional, Dict, Any
 class FinanceAnalyzerError(Exception):
     """Base exception for Finance Analyzer"""
     
+    # Route-specific client message, overriding PUBLIC_ERROR_MESSAGES
+    public_message: Optional[str] = None
+    
     def __init__(self, message: str, code: str = "GENERIC_ERROR", details: Optional[Dict[str, Any]] = None):
         self.message = message
         self.code = code
@@ -55,4 +58,62 @@ class RateLimitError(FinanceAnalyzerError):
     """Raised when rate limit is exceeded"""
     
     def __init__(self, message: str = "Rate limit exceeded", details: Optional[Dict[str, Any]] = None):
-        super().__init__(message, "RATE_LIMIT_ERROR", details)
\ No newline at end of file
+        super().__init__(message, "RATE_LIMIT_ERROR", details)
+
+
+class InternalError(FinanceAnalyzerError):
+    """Raised by a route in place of an unexpected exception"""
+    
+    def __init__(self, message: str = "An unexpected error occurred", details: Optional[Dict[str, Any]] = None):
+        super().__init__(message, "INTERNAL_ERROR", details)
+
+
+# HTTP status per error type, looked up along the exception's MRO
+ERROR_STATUS = {
+    ValidationError: 400,
+    FileValidationError: 400,
+    AudioProcessingError: 400,
+    TranscriptionError: 400,
+    NLPProcessingError: 500,
+    RateLimitError: 429,
+    InternalError: 500,
+    FinanceAnalyzerError: 400,
+}
+
+# Client-facing error codes that differ from the lower-cased exception code
+ERROR_CODES = {
+    NLPProcessingError: "processing_error",
+}
+
+# Client-facing messages for errors whose own message may expose internals
+PUBLIC_ERROR_MESSAGES = {
+    AudioProcessingError: "Failed to process audio file",
+    TranscriptionError: "Failed to transcribe audio",
+    NLPProcessingError: "Failed to analyze text. Please try again.",
+}
+
+
+def error_status(exc: FinanceAnalyzerError) -> int:
+    """HTTP status code for an application error"""
+    for cls in type(exc).__mro__:
+        if cls in ERROR_STATUS:
+            return ERROR_STATUS[cls]
+    return 500
+
+
+def error_code(exc: FinanceAnalyzerError) -> str:
+    """Error code returned to the client"""
+    for cls in type(exc).__mro__:
+        if cls in ERROR_CODES:
+            return ERROR_CODES[cls]
+    return exc.code.lower()
+
+
+def public_error_message(exc: FinanceAnalyzerError) -> str:
+    """Message safe to return to the client"""
+    if exc.public_message:
+        return exc.public_message
+    for cls in type(exc).__mro__:
+        if cls in PUBLIC_ERROR_MESSAGES:
+            return PUBLIC_ERROR_MESSAGES[cls]
+    return exc.message
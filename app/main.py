@@ -3,20 +3,25 @@ Main FastAPI application
 """
 import time
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request, HTTPException
+from typing import Any, Dict, Optional
+import orjson
+from fastapi import FastAPI, Request, Response, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.exceptions import RequestValidationError
-from app.config import settings
-from app.core.logging import setup_logging, get_logger
-from app.middleware import RequestLoggingMiddleware, SecurityHeadersMiddleware
-from app.api.endpoints import router
-from app.exceptions import FinanceAnalyzerError
-from app.models.responses import ErrorResponse, ErrorDetail
-from app.services.audio_service import audio_processor
+from fastapi.encoders import jsonable_encoder
+from app.config import settings, CORS_ORIGINS
+from app.core.executors import shutdown_executors
+from app.core.logging import setup_logging, shutdown_logging, get_logger, log_error
+from app.middleware import CombinedRequestMiddleware, SelectiveGZipMiddleware
+from app.core.security import redis_rate_limiter
 from app.services.transcription_service import transcription_service
-from app.utils.file_utils import file_handler
+from app.api.endpoints import router
+from app.exceptions import (
+    FinanceAnalyzerError, ValidationError, FileValidationError,
+    error_code, error_status, public_error_message
+)
+from app.models.responses import new_id, utc_now
 
 # Setup logging
 setup_logging()
@@ -39,12 +44,16 @@ async def lifespan(app: FastAPI):
     
     # Cleanup services
     try:
-        await audio_processor.cleanup()
-        await transcription_service.cleanup()
-        await file_handler.cleanup_all()
+        await transcription_service.close()
+        shutdown_executors()
+        if redis_rate_limiter is not None:
+            await redis_rate_limiter.close()
         logger.info("✅ Cleanup completed successfully")
     except Exception as e:
         logger.error(f"❌ Cleanup error: {e}")
+    
+    # Flush queued log records
+    shutdown_logging()
 
 
 # Create FastAPI application
@@ -53,46 +62,82 @@ app = FastAPI(
     description="AI-powered financial analysis from voice and text with production-ready security and performance",
     version=settings.app_version,
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs" if settings.debug else None,
     redoc_url="/redoc" if settings.debug else None,
 )
 
 # Add middleware (order matters!)
-app.add_middleware(RequestLoggingMiddleware)
-app.add_middleware(SecurityHeadersMiddleware)
+# Middleware wraps the whole app, mounted sub-apps included, so the analysis
+# routes cannot shed it by moving to a mounted app; keep each layer cheap instead
+app.add_middleware(CombinedRequestMiddleware)
 
 # CORS middleware with proper configuration
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=settings.cors_origins_list,
+    allow_origins=list(CORS_ORIGINS),
     allow_credentials=True,
     allow_methods=["GET", "POST"],
     allow_headers=["Content-Type", "Authorization", "X-Request-ID"],
     expose_headers=["X-Request-ID"],
 )
 
-# Compression middleware
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+# Compression middleware, limited to the routes with large responses
+app.add_middleware(SelectiveGZipMiddleware)
 
 # Include API routes
 app.include_router(router)
 
 
 # Exception handlers
+def _error_response(request: Request, status_code: int, code: str, message: str,
+                    field: Optional[str] = None,
+                    details: Optional[Dict[str, Any]] = None) -> Response:
+    """
+    Build the standard error envelope (the ErrorResponse shape) without pydantic.
+    
+    Every field is server-generated, so validating it on the error path, which
+    is hottest during rate-limit or validation floods, buys nothing.
+    """
+    body = {
+        "success": False,
+        "timestamp": utc_now(),
+        "request_id": getattr(request.state, "request_id", None) or new_id(),
+        "error": {
+            "code": code,
+            "message": message,
+            "field": field,
+            "details": details,
+        },
+    }
+    return Response(
+        content=orjson.dumps(body, default=str, option=orjson.OPT_UTC_Z),
+        status_code=status_code,
+        media_type="application/json"
+    )
+
+
 @app.exception_handler(FinanceAnalyzerError)
 async def finance_analyzer_error_handler(request: Request, exc: FinanceAnalyzerError):
     """Handle custom application errors"""
-    logger.warning(f"Application error: {exc.message}")
-    
-    return JSONResponse(
-        status_code=400,
-        content=ErrorResponse(
-            error=ErrorDetail(
-                code=exc.code,
-                message=exc.message,
-                details=exc.details
-            )
-        ).dict()
+    status_code = error_status(exc)
+    
+    if isinstance(exc, (ValidationError, FileValidationError)):
+        logger.warning(f"{type(exc).__name__}: {exc.message}")
+    else:
+        log_error(logger, exc, {"path": request.url.path})
+    
+    details = dict(exc.details)
+    if getattr(exc, "filename", None):
+        details["filename"] = exc.filename
+    
+    return _error_response(
+        request,
+        status_code,
+        error_code(exc),
+        public_error_message(exc),
+        field=getattr(exc, "field", None),
+        details=details or None
     )
 
 
@@ -108,16 +153,13 @@ async def validation_error_handler(request: Request, exc: RequestValidationError
         if 'loc' in error and error['loc']:
             field = '.'.join(str(loc) for loc in error['loc'])
     
-    return JSONResponse(
-        status_code=422,
-        content=ErrorResponse(
-            error=ErrorDetail(
-                code="VALIDATION_ERROR",
-                message="Invalid request data",
-                field=field,
-                details={"validation_errors": exc.errors()}
-            )
-        ).dict()
+    return _error_response(
+        request,
+        422,
+        "VALIDATION_ERROR",
+        "Invalid request data",
+        field=field,
+        details={"validation_errors": jsonable_encoder(exc.errors())}
     )
 
 
@@ -126,40 +168,26 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     """Handle HTTP exceptions"""
     # If detail is already a dict (from our endpoints), use it directly
     if isinstance(exc.detail, dict):
-        error_detail = ErrorDetail(
-            code=exc.detail.get("error", "HTTP_ERROR"),
-            message=exc.detail.get("message", str(exc.detail)),
+        return _error_response(
+            request,
+            exc.status_code,
+            exc.detail.get("error", "HTTP_ERROR"),
+            exc.detail.get("message", str(exc.detail)),
             details=exc.detail
         )
-    else:
-        error_detail = ErrorDetail(
-            code="HTTP_ERROR",
-            message=str(exc.detail)
-        )
     
-    return JSONResponse(
-        status_code=exc.status_code,
-        content=ErrorResponse(error=error_detail).dict()
-    )
+    return _error_response(request, exc.status_code, "HTTP_ERROR", str(exc.detail))
 
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle unexpected errors"""
-    logger.error(f"Unexpected error: {exc}", exc_info=True)
+    log_error(logger, exc, {"path": request.url.path})
     
     # Don't expose internal errors in production
     message = str(exc) if settings.debug else "An unexpected error occurred"
     
-    return JSONResponse(
-        status_code=500,
-        content=ErrorResponse(
-            error=ErrorDetail(
-                code="INTERNAL_ERROR",
-                message=message
-            )
-        ).dict()
-    )
+    return _error_response(request, 500, "INTERNAL_ERROR", message)
 
 
 # Additional endpoints for monitoring
@@ -186,6 +214,7 @@ async def metrics():
 
 
 if __name__ == "__main__":
+    import os
     import uvicorn
     
     logger.info(f"Starting server on {settings.host}:{settings.port}")
@@ -193,7 +222,15 @@ if __name__ == "__main__":
         "app.main:app",
         host=settings.host,
         port=settings.port,
+        # uvloop where installed (not on Windows), httptools for HTTP parsing
+        loop="auto",
+        http="httptools",
+        # Reload needs a single process; set REDIS_URL so rate limits span workers
+        workers=1 if settings.debug else (os.cpu_count() or 1),
         log_level=settings.log_level.lower(),
-        access_log=True,
+        # CombinedRequestMiddleware already logs every request
+        access_log=False,
+        # Don't advertise the server software
+        server_header=False,
         reload=settings.debug
     )
\ No newline at end of file
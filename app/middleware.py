@@ -2,71 +2,104 @@
 Custom middleware for the application
 """
 import time
-import uuid
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from app.core.logging import get_logger, log_request
-from app.core.security import get_client_ip
-from app.exceptions import FinanceAnalyzerError
+from datetime import datetime, timezone
+from typing import Tuple
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.logging import get_logger, log_request, request_id_var, client_ip_var
+from app.core.security import client_ip_from_scope
+from app.models.responses import new_id, request_now
 
 logger = get_logger("middleware")
 
+# Security headers, encoded once instead of on every response; a tuple, since
+# every response shares these exact objects
+_SECURITY_HEADERS: Tuple[Tuple[bytes, bytes], ...] = (
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+    (b"content-security-policy", (
+        b"default-src 'self'; "
+        b"script-src 'self' 'unsafe-inline'; "
+        b"style-src 'self' 'unsafe-inline'; "
+        b"img-src 'self' data:; "
+        b"font-src 'self'; "
+        b"connect-src 'self'"
+    )),
+)
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware for logging HTTP requests"""
+# Monitoring probes skip request IDs, logging and headers entirely
+_BYPASS_PATHS = frozenset(("/health", "/metrics"))
+
+# Only the analysis responses can grow large enough to be worth compressing
+_COMPRESSED_PATHS = frozenset(("/analyze", "/voice"))
+
+
+class CombinedRequestMiddleware:
+    """Request ID, timing, logging and security headers in a single middleware layer"""
     
-    async def dispatch(self, request: Request, call_next):
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in _BYPASS_PATHS:
+            await self.app(scope, receive, send)
+            return
+        
         # Generate request ID
-        request_id = str(uuid.uuid4())
-        request.state.request_id = request_id
+        request_id = new_id()
+        
+        # Get client info (resolved once, reused by rate limiting)
+        headers = Headers(scope=scope)
+        client_ip = client_ip_from_scope(scope, headers)
         
-        # Get client info
-        client_ip = get_client_ip(request)
+        # Exposed to handlers as request.state
+        state = scope.setdefault("state", {})
+        state["request_id"] = request_id
+        state["client_ip"] = client_ip
         
-        # Start timing
-        start_time = time.time()
+        method = scope["method"]
+        path = scope["path"]
         
-        # Log request start
-        logger.info(
-            f"Request started: {request.method} {request.url.path}",
-            extra={
-                "request_id": request_id,
-                "method": request.method,
-                "path": request.url.path,
-                "client_ip": client_ip,
-                "user_agent": request.headers.get("user-agent", ""),
-                "type": "request_start"
-            }
-        )
+        # Start timing; response models stamp themselves with this request's time
+        start_time = time.perf_counter_ns()
+        request_now_token = request_now.set(datetime.now(timezone.utc))
+        
+        # Every log record written while handling the request carries these
+        request_id_token = request_id_var.set(request_id)
+        client_ip_token = client_ip_var.set(client_ip)
+        
+        status_code = 500
+        request_id_header = (b"x-request-id", request_id.encode("latin-1"))
+        
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Add request ID and security headers (uvicorn runs with
+                # server_header=False, so there is no server header to strip)
+                response_headers = list(message.get("headers", ()))
+                response_headers.append(request_id_header)
+                response_headers.extend(_SECURITY_HEADERS)
+                message["headers"] = response_headers
+            await send(message)
         
         try:
             # Process request
-            response = await call_next(request)
-            
-            # Calculate duration
-            duration_ms = (time.time() - start_time) * 1000
-            
-            # Add request ID to response headers
-            response.headers["X-Request-ID"] = request_id
-            
-            # Log successful request
-            log_request(logger, request.method, request.url.path, 
-                       client_ip, duration_ms, response.status_code)
-            
-            return response
+            await self.app(scope, receive, send_wrapper)
             
         except Exception as e:
             # Calculate duration
-            duration_ms = (time.time() - start_time) * 1000
+            duration_ms = (time.perf_counter_ns() - start_time) / 1e6
             
             # Log error
             logger.error(
-                f"Request failed: {request.method} {request.url.path}",
+                f"Request failed: {method} {path}",
                 extra={
-                    "request_id": request_id,
-                    "method": request.method,
-                    "path": request.url.path,
-                    "client_ip": client_ip,
+                    "method": method,
+                    "path": path,
                     "duration_ms": duration_ms,
                     "error": str(e),
                     "error_type": type(e).__name__,
@@ -76,30 +109,33 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
             )
             
             raise
+        
+        else:
+            # Calculate duration
+            duration_ms = (time.perf_counter_ns() - start_time) / 1e6
+            
+            # One record per request, written once it has completed
+            log_request(
+                logger, method, path, client_ip, duration_ms, status_code,
+                user_agent=headers.get("user-agent", "")
+            )
+        
+        finally:
+            request_now.reset(request_now_token)
+            request_id_var.reset(request_id_token)
+            client_ip_var.reset(client_ip_token)
 
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    """Middleware for adding security headers"""
+class SelectiveGZipMiddleware:
+    """Gzip responses of the analysis routes only, at a cheap compression level"""
     
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        
-        # Add security headers
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        response.headers["Content-Security-Policy"] = (
-            "default-src 'self'; "
-            "script-src 'self' 'unsafe-inline'; "
-            "style-src 'self' 'unsafe-inline'; "
-            "img-src 'self' data:; "
-            "font-src 'self'; "
-            "connect-src 'self'"
-        )
-        
-        # Remove server header
-        if "server" in response.headers:
-            del response.headers["server"]
-        
-        return response
\ No newline at end of file
+    def __init__(self, app: ASGIApp, minimum_size: int = 4096, compresslevel: int = 1):
+        self.app = app
+        # Level 1 keeps most of the size savings at a fraction of level 9's CPU
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=compresslevel)
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and scope["path"] in _COMPRESSED_PATHS:
+            await self.gzip(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
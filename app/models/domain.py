@@ -5,6 +5,7 @@ from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel, Field
 from enum import Enum
+from app.models.responses import TransactionDetail, utc_now
 
 
 class TransactionType(str, Enum):
@@ -35,7 +36,7 @@ class Transaction(BaseModel):
     """Domain transaction model"""
     
     id: str
-    amount: Optional[float] = None
+    amount: Optional[float] = Field(None, ge=0)
     currency: Currency = Currency.EGP
     transaction_type: TransactionType
     category: str
@@ -46,7 +47,7 @@ class Transaction(BaseModel):
     description: Optional[str] = None
     confidence_score: float = Field(default=0.0, ge=0, le=1)
     extracted_from: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=utc_now)
     
     def to_response_model(self) -> dict:
         """Convert to API response format"""
@@ -62,4 +63,26 @@ class Transaction(BaseModel):
             "transaction_type": self.transaction_type.value,
             "confidence_score": self.confidence_score,
             "extracted_text": self.extracted_from
-        }
\ No newline at end of file
+        }
+    
+    def to_response_detail(self) -> TransactionDetail:
+        """
+        Convert to an API response model without re-validating
+        
+        This model enforces the same constraints as TransactionDetail
+        (amount >= 0, confidence_score in [0, 1]), so the response model
+        is constructed directly.
+        """
+        return TransactionDetail.model_construct(
+            id=self.id,
+            amount=self.amount,
+            currency=self.currency.value,
+            category=self.category,
+            subcategory=self.subcategory,
+            item=self.item,
+            merchant=self.merchant,
+            location=self.location,
+            transaction_type=self.transaction_type.value,
+            confidence_score=self.confidence_score,
+            extracted_text=self.extracted_from
+        )
\ No newline at end of file
@@ -1,18 +1,35 @@
 """
 Response models for API endpoints
 """
-from datetime import datetime
+from binascii import hexlify
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from os import urandom
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
-import uuid
+
+
+def new_id() -> str:
+    """Random 128-bit hex identifier, cheaper to build than str(uuid.uuid4())"""
+    return hexlify(urandom(16)).decode("ascii")
+
+
+# Set once per request by CombinedRequestMiddleware, so every model built
+# while handling it shares one timestamp
+request_now: ContextVar[Optional[datetime]] = ContextVar("request_now", default=None)
+
+
+def utc_now() -> datetime:
+    """Current request's timestamp, or the current UTC time outside a request"""
+    return request_now.get() or datetime.now(timezone.utc)
 
 
 class APIResponse(BaseModel):
     """Base API response wrapper"""
     
     success: bool = True
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
-    request_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    timestamp: datetime = Field(default_factory=utc_now)
+    request_id: str = Field(default_factory=new_id)
 
 
 class SuccessResponse(APIResponse):
@@ -41,7 +58,7 @@ class ErrorResponse(APIResponse):
 class TransactionDetail(BaseModel):
     """Individual transaction details"""
     
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     amount: Optional[float] = Field(None, ge=0, description="Transaction amount")
     currency: str = Field(default="EGP", description="Currency code")
     category: str = Field(..., description="Transaction category")
@@ -166,5 +183,5 @@ class HealthResponse(BaseModel):
     status: str = "healthy"
     service: str = "finance-analyzer"
     version: str = "1.0.0"
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=utc_now)
     uptime_seconds: Optional[float] = None
\ No newline at end of file
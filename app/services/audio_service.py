@@ -2,10 +2,11 @@
 Audio processing service
 """
 import asyncio
+import subprocess
 import time
-from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple
 from pydub import AudioSegment
+from app.core.executors import io_executor
 from app.core.logging import get_logger
 from app.config import settings
 from app.exceptions import AudioProcessingError
@@ -18,28 +19,22 @@ class AudioProcessor:
     """Audio processing with async support"""
     
     def __init__(self):
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.executor = io_executor
     
     async def process_audio_file(self, file_path: str) -> Tuple[str, float]:
         """Process audio file and return path to processed WAV file and duration"""
         try:
-            start_time = time.time()
+            start_time = time.perf_counter()
             
             # Run audio processing in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
+            loop = asyncio.get_running_loop()
             
-            # Load and process audio
-            audio, duration = await loop.run_in_executor(
-                self.executor, self._process_audio_sync, file_path
+            # Load, process and export in one worker task
+            wav_path, duration = await loop.run_in_executor(
+                self.executor, self._process_and_export, file_path
             )
             
-            # Export to WAV format
-            wav_path = file_path + ".wav"
-            await loop.run_in_executor(
-                self.executor, audio.export, wav_path, "wav"
-            )
-            
-            processing_time = time.time() - start_time
+            processing_time = time.perf_counter() - start_time
             logger.info(f"Audio processed in {processing_time:.2f}s, duration: {duration:.2f}s")
             
             return wav_path, duration
@@ -48,27 +43,53 @@ class AudioProcessor:
             logger.error(f"Audio processing failed: {e}", exc_info=True)
             raise AudioProcessingError(f"Failed to process audio: {str(e)}")
     
-    def _process_audio_sync(self, file_path: str) -> Tuple[AudioSegment, float]:
-        """Synchronous audio processing"""
+    def _process_and_export(self, file_path: str) -> Tuple[str, float]:
+        """Synchronous audio processing and WAV export"""
         try:
-            # Load audio file
-            audio = AudioSegment.from_file(file_path)
+            # Load audio file, already in the required format
+            audio = self._decode_audio(file_path)
             
             # Get original duration
             duration_seconds = len(audio) / 1000.0
             
-            # Convert to required format
-            audio = audio.set_channels(settings.channels)
-            audio = audio.set_frame_rate(settings.sample_rate)
-            
             # Normalize audio levels
             audio = self._normalize_audio(audio)
             
-            return audio, duration_seconds
+            # Export to WAV format
+            wav_path = file_path + ".wav"
+            audio.export(wav_path, format="wav")
+            
+            return wav_path, duration_seconds
             
         except Exception as e:
             raise AudioProcessingError(f"Audio processing error: {str(e)}")
     
+    def _decode_audio(self, file_path: str) -> AudioSegment:
+        """Decode, downmix and resample in a single ffmpeg pass"""
+        try:
+            result = subprocess.run(
+                [
+                    AudioSegment.converter, "-nostdin", "-v", "error",
+                    "-i", file_path,
+                    "-ac", str(settings.channels),
+                    "-ar", str(settings.sample_rate),
+                    "-f", "s16le", "-acodec", "pcm_s16le", "-"
+                ],
+                capture_output=True,
+                check=True
+            )
+        except subprocess.CalledProcessError as e:
+            raise AudioProcessingError(
+                f"ffmpeg failed: {e.stderr.decode(errors='replace').strip()}"
+            )
+        
+        return AudioSegment(
+            data=result.stdout,
+            sample_width=2,
+            frame_rate=settings.sample_rate,
+            channels=settings.channels
+        )
+    
     def _normalize_audio(self, audio: AudioSegment) -> AudioSegment:
         """Normalize audio levels"""
         try:
@@ -96,10 +117,6 @@ class AudioProcessor:
         min_duration = 0.5  # 0.5 seconds
         
         return min_duration <= duration <= max_duration
-    
-    async def cleanup(self):
-        """Cleanup resources"""
-        self.executor.shutdown(wait=True)
 
 
 # Global audio processor instance
@@ -2,117 +2,219 @@
 NLP service for text analysis and transaction extraction
 """
 import re
+import sys
 import time
-import uuid
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple
 from app.core.logging import get_logger
+from app.config import INCOME_KEYWORDS
 from app.utils.text_utils import (
     normalize_arabic_text, extract_amounts_from_text, 
     split_text_into_segments, detect_language
 )
 from app.utils.cache import cached_text_analysis
+from app.utils.keyword_matcher import KeywordMatcher
 from app.utils.content_filter import content_filter
 from app.models.domain import Transaction, TransactionType
-from app.models.responses import TransactionDetail, FinancialSummary, AnalysisResult
-from app.config import INCOME_KEYWORDS, EXPENSE_KEYWORDS
+from app.models.responses import FinancialSummary, AnalysisResult, new_id
 from app.exceptions import NLPProcessingError, ValidationError
 
 logger = get_logger("nlp_service")
 
+# Item extraction patterns, tried in order
+_ITEM_PATTERNS = (
+    re.compile(r'(?:على|علي)\s+(\w+)'),             # على خضار
+    re.compile(r'(?:من|في)\s+(\w+)'),                # من اللحم
+    re.compile(r'(?:اشتريت|شريت|جبت|اخدت)\s+(\w+)'),  # اشتريت خضار
+)
+
+# Verbs marking a segment as a transaction, as spending, and as a confident
+# extraction; found in one scan together with the income keywords
+_ACTION_VERBS = ['دفعت', 'اشتريت', 'جبت', 'استلمت', 'قبضت', 'صرفت', 'كلت', 'شربت']
+_SPENDING_VERBS = ['دفعت', 'اشتريت', 'جبت', 'صرفت', 'كلت', 'شربت', 'خلصت']
+_CONFIDENCE_VERBS = ['دفعت', 'اشتريت', 'جبت', 'استلمت', 'قبضت']
+
+_SEGMENT_MATCHER = KeywordMatcher(
+    [(verb, 'action') for verb in _ACTION_VERBS] +
+    [(verb, 'spending') for verb in _SPENDING_VERBS] +
+    [(verb, 'confident') for verb in _CONFIDENCE_VERBS] +
+    [(keyword, 'income') for keyword in INCOME_KEYWORDS]
+)
+
+
+def segment_roles(text_lower: str) -> Set[str]:
+    """Roles ('action', 'spending', 'confident', 'income') of the words in lowercased text"""
+    return _SEGMENT_MATCHER.tags(text_lower)
+
+
+# Common words and places that are never the purchased item
+_EXCLUDED_ITEMS = frozenset({
+    'في', 'من', 'على', 'ال', 'the', 'a', 'an', 'كارفور', 'ميترو',
+    'حاجة', 'جوه', 'للقطر', 'قطر', 'قطار'
+})
+
+
+# Category keywords and places; names and keywords interned, and frozen so
+# every classifier shares one copy
+_RAW_CATEGORY_MAP = {
+    'طعام وشراب': {
+        'keywords': [
+            'طعام', 'أكل', 'اكل', 'خضار', 'خضروات', 'فواكه', 'فاكهة', 'لحم', 'لحمة', 
+            'فراخ', 'فرخة', 'دجاج', 'سمك', 'عيش', 'خبز', 'جبنة', 'جبن', 'لبن', 'حليب',
+            'بيض', 'زيت', 'سكر', 'رز', 'أرز', 'مكرونة', 'معكرونة', 'بطاطس',
+            'مطعم', 'restaurant', 'كشري', 'فول', 'طعمية', 'قهوة', 'كافيه', 'كافي',
+            'food', 'grocery', 'vegetables', 'fruits', 'meat', 'chicken', 'fish'
+        ],
+        'places': ['كارفور', 'carrefour', 'سبينس', 'spinneys', 'ميترو', 'metro']
+    },
+    'مواصلات': {
+        'keywords': [
+            'مواصلات', 'بنزين', 'وقود', 'سولار', 'تاكسي', 'أوبر', 'اوبر', 'كريم', 'مترو', 
+            'اتوبيس', 'ميكروباص', 'توكتوك', 'اجرة', 'عربية', 'سيارة', 'قطر', 'قطار',
+            'تذكرة', 'تسكرة', 'ركبت', 'transport', 'gas', 'fuel', 'taxi', 'uber', 'careem', 
+            'bus', 'metro', 'car', 'train', 'ticket'
+        ],
+        'places': []
+    },
+    'تسوق': {
+        'keywords': [
+            'محل', 'سوبر ماركت', 'supermarket', 'بقالة', 'بقال', 'جمعية', 'حاجات',
+            'تسوق', 'shopping', 'mall', 'مول'
+        ],
+        'places': ['كارفور', 'carrefour', 'سبينس', 'spinneys', 'ميترو', 'metro']
+    },
+    'مرتب ودخل': {
+        'keywords': [
+            'مرتب', 'راتب', 'معاش', 'salary', 'wage', 'قبضت', 'استلمت مرتب', 
+            'مكافأة', 'بونص', 'حافز', 'عمولة', 'ارباح', 'دخل'
+        ],
+        'places': []
+    },
+    'ملابس': {
+        'keywords': [
+            'ملابس', 'هدوم', 'لبس', 'جزمة', 'شنطة', 'حذاء', 'بنطلون', 'قميص',
+            'فستان', 'جاكت', 'بلوفر', 'جينز', 'عطر', 'مكياج', 'اكسسوار',
+            'clothes', 'shopping', 'shoes', 'bag'
+        ],
+        'places': ['مول', 'سيتي ستارز', 'مول العرب']
+    },
+    'فواتير': {
+        'keywords': [
+            'فاتورة', 'كهرباء', 'كهربا', 'مياه', 'ميه', 'انترنت', 'نت', 'موبايل', 
+            'تليفون', 'غاز', 'تلفون', 'خط', 'باقة', 'اشتراك',
+            'bill', 'electricity', 'water', 'internet', 'mobile', 'phone', 'gas', 'subscription'
+        ],
+        'places': []
+    },
+    'ترفيه': {
+        'keywords': [
+            'سينما', 'فيلم', 'ترفيه', 'مسرح', 'حفلة', 'حفل', 'كونسرت', 'نادي', 'جيم',
+            'cinema', 'movie', 'entertainment', 'film', 'concert', 'gym', 'club'
+        ],
+        'places': []
+    },
+    'صحة': {
+        'keywords': [
+            'دواء', 'طبيب', 'صيدلية', 'دكتور', 'علاج', 'مستشفى', 'عيادة', 'تحليل', 
+            'اشعة', 'كشف', 'عملية', 'روشتة',
+            'medicine', 'doctor', 'pharmacy', 'health', 'hospital', 'clinic', 'medical'
+        ],
+        'places': []
+    }
+}
+
+_CATEGORY_MAP = {
+    sys.intern(category): {
+        'keywords': frozenset(map(sys.intern, data['keywords'])),
+        'places': tuple(sys.intern(place.lower()) for place in data['places']),
+    }
+    for category, data in _RAW_CATEGORY_MAP.items()
+}
+
+
+# Merchants by canonical name, with the spellings that identify them; the
+# first listed merchant found in a text wins
+_PLACES = {
+    'كارفور': ['كارفور', 'carrefour'],
+    'سبينس': ['سبينس', 'spinneys'],
+    'ميترو': ['metro', 'ميترو'],
+    'خير زمان': ['خير زمان'],
+    'العثيم': ['العثيم'],
+    'بنده': ['بنده', 'panda'],
+    'هايبر': ['هايبر', 'hyper'],
+    'لولو': ['لولو', 'lulu'],
+    'فتح الله': ['فتح الله', 'fathalla'],
+    'كازيون': ['كازيون', 'kazyon'],
+    'سيتي ستارز': ['سيتي ستارز', 'city stars'],
+    'مول العرب': ['مول العرب', 'mall of arabia'],
+}
+
+_PLACE_NAMES = tuple(_PLACES)
+_PLACE_MATCHER = KeywordMatcher(
+    (keyword, rank)
+    for rank, keywords in enumerate(_PLACES.values())
+    for keyword in keywords
+)
+
 
 class CategoryClassifier:
     """Classify transactions into categories"""
     
     def __init__(self):
-        self.category_map = {
-            'طعام وشراب': {
-                'keywords': [
-                    'طعام', 'أكل', 'اكل', 'خضار', 'خضروات', 'فواكه', 'فاكهة', 'لحم', 'لحمة', 
-                    'فراخ', 'فرخة', 'دجاج', 'سمك', 'عيش', 'خبز', 'جبنة', 'جبن', 'لبن', 'حليب',
-                    'بيض', 'زيت', 'سكر', 'رز', 'أرز', 'مكرونة', 'معكرونة', 'بطاطس',
-                    'مطعم', 'restaurant', 'كشري', 'فول', 'طعمية', 'قهوة', 'كافيه', 'كافي',
-                    'food', 'grocery', 'vegetables', 'fruits', 'meat', 'chicken', 'fish'
-                ],
-                'places': ['كارفور', 'carrefour', 'سبينس', 'spinneys', 'ميترو', 'metro']
-            },
-            'مواصلات': {
-                'keywords': [
-                    'مواصلات', 'بنزين', 'وقود', 'سولار', 'تاكسي', 'أوبر', 'اوبر', 'كريم', 'مترو', 
-                    'اتوبيس', 'ميكروباص', 'توكتوك', 'اجرة', 'عربية', 'سيارة', 'قطر', 'قطار',
-                    'تذكرة', 'تسكرة', 'ركبت', 'transport', 'gas', 'fuel', 'taxi', 'uber', 'careem', 
-                    'bus', 'metro', 'car', 'train', 'ticket'
-                ],
-                'places': []
-            },
-            'تسوق': {
-                'keywords': [
-                    'محل', 'سوبر ماركت', 'supermarket', 'بقالة', 'بقال', 'جمعية', 'حاجات',
-                    'تسوق', 'shopping', 'mall', 'مول'
-                ],
-                'places': ['كارفور', 'carrefour', 'سبينس', 'spinneys', 'ميترو', 'metro']
-            },
-            'مرتب ودخل': {
-                'keywords': [
-                    'مرتب', 'راتب', 'معاش', 'salary', 'wage', 'قبضت', 'استلمت مرتب', 
-                    'مكافأة', 'بونص', 'حافز', 'عمولة', 'ارباح', 'دخل'
-                ],
-                'places': []
-            },
-            'ملابس': {
-                'keywords': [
-                    'ملابس', 'هدوم', 'لبس', 'جزمة', 'شنطة', 'حذاء', 'بنطلون', 'قميص',
-                    'فستان', 'جاكت', 'بلوفر', 'جينز', 'عطر', 'مكياج', 'اكسسوار',
-                    'clothes', 'shopping', 'shoes', 'bag'
-                ],
-                'places': ['مول', 'سيتي ستارز', 'مول العرب']
-            },
-            'فواتير': {
-                'keywords': [
-                    'فاتورة', 'كهرباء', 'كهربا', 'مياه', 'ميه', 'انترنت', 'نت', 'موبايل', 
-                    'تليفون', 'غاز', 'تلفون', 'خط', 'باقة', 'اشتراك',
-                    'bill', 'electricity', 'water', 'internet', 'mobile', 'phone', 'gas', 'subscription'
-                ],
-                'places': []
-            },
-            'ترفيه': {
-                'keywords': [
-                    'سينما', 'فيلم', 'ترفيه', 'مسرح', 'حفلة', 'حفل', 'كونسرت', 'نادي', 'جيم',
-                    'cinema', 'movie', 'entertainment', 'film', 'concert', 'gym', 'club'
-                ],
-                'places': []
-            },
-            'صحة': {
-                'keywords': [
-                    'دواء', 'طبيب', 'صيدلية', 'دكتور', 'علاج', 'مستشفى', 'عيادة', 'تحليل', 
-                    'اشعة', 'كشف', 'عملية', 'روشتة',
-                    'medicine', 'doctor', 'pharmacy', 'health', 'hospital', 'clinic', 'medical'
-                ],
-                'places': []
-            }
+        # Shared, immutable category data
+        self.category_map = _CATEGORY_MAP
+        
+        # Special cases win over everything, then places, then keywords; within
+        # each tier the earlier entry wins. Tags are indexes into this list.
+        special_cases = [
+            ('مواصلات', ['تذكرة', 'تسكرة']),
+            ('طعام وشراب', ['قهوة', 'كافيه']),
+        ]
+        self._ranked_categories = [category for category, _ in special_cases]
+        self._special_count = len(special_cases)
+        self._ranked_categories.extend(self.category_map)
+        
+        keyword_tags = [
+            (keyword, rank)
+            for rank, (_, keywords) in enumerate(special_cases)
+            for keyword in keywords
+        ]
+        place_tags: List[Tuple[str, int]] = []
+        for rank, data in enumerate(self.category_map.values(), start=self._special_count):
+            keyword_tags.extend((keyword, rank) for keyword in data['keywords'])
+            place_tags.extend((p, rank) for p in data['places'])
+        
+        # One scan per text instead of an `in` test per keyword
+        self._keyword_matcher = KeywordMatcher(keyword_tags)
+        self._place_matcher = KeywordMatcher(place_tags)
+        
+        # extract_place only returns canonical merchant names, so resolve
+        # their category once here instead of scanning them on every call
+        self._place_ranks = {
+            name: self._place_matcher.tags(name.lower()) for name in _PLACE_NAMES
         }
     
-    def classify(self, text: str, place: Optional[str] = None) -> str:
+    def classify(self, text: str, place: Optional[str] = None,
+                 normalized_lower: Optional[str] = None) -> str:
         """Classify transaction into category"""
-        text_lower = normalize_arabic_text(text.lower())
+        if normalized_lower is None:
+            normalized_lower = normalize_arabic_text(text.lower())
+        keyword_ranks = self._keyword_matcher.tags(normalized_lower)
         
         # Special cases first
-        if 'تذكرة' in text_lower or 'تسكرة' in text_lower:
-            return 'مواصلات'
-        
-        if 'قهوة' in text_lower or 'كافيه' in text_lower:
-            return 'طعام وشراب'
+        if keyword_ranks and min(keyword_ranks) < self._special_count:
+            return self._ranked_categories[min(keyword_ranks)]
         
         # Check place-based classification
         if place:
-            place_lower = place.lower()
-            for category, data in self.category_map.items():
-                if any(p in place_lower for p in data['places']):
-                    return category
+            place_ranks = self._place_ranks.get(place)
+            if place_ranks is None:
+                place_ranks = self._place_matcher.tags(place.lower())
+            if place_ranks:
+                return self._ranked_categories[min(place_ranks)]
         
         # Check keyword-based classification
-        for category, data in self.category_map.items():
-            if any(keyword in text_lower for keyword in data['keywords']):
-                return category
+        if keyword_ranks:
+            return self._ranked_categories[min(keyword_ranks)]
         
         return 'أخرى'
 
@@ -122,34 +224,21 @@ class TransactionExtractor:
     
     def __init__(self):
         self.classifier = CategoryClassifier()
-        self.places_map = {
-            'كارفور': ['كارفور', 'carrefour'],
-            'سبينس': ['سبينس', 'spinneys'],
-            'ميترو': ['metro', 'ميترو'],
-            'خير زمان': ['خير زمان'],
-            'العثيم': ['العثيم'],
-            'بنده': ['بنده', 'panda'],
-            'هايبر': ['هايبر', 'hyper'],
-            'لولو': ['لولو', 'lulu'],
-            'فتح الله': ['فتح الله', 'fathalla'],
-            'كازيون': ['كازيون', 'kazyon'],
-            'سيتي ستارز': ['سيتي ستارز', 'city stars'],
-            'مول العرب': ['مول العرب', 'mall of arabia'],
-        }
+        self.places_map = _PLACES
     
-    def extract_place(self, text: str) -> Optional[str]:
+    def extract_place(self, text: str, text_lower: Optional[str] = None) -> Optional[str]:
         """Extract place/merchant from text"""
-        text_lower = text.lower()
+        if text_lower is None:
+            text_lower = text.lower()
         
-        for place_name, keywords in self.places_map.items():
-            if any(kw in text_lower for kw in keywords):
-                return place_name
-        
-        return None
+        ranks = _PLACE_MATCHER.tags(text_lower)
+        return _PLACE_NAMES[min(ranks)] if ranks else None
     
-    def extract_item(self, text: str, category: str) -> Optional[str]:
+    def extract_item(self, text: str, category: str,
+                     text_lower: Optional[str] = None) -> Optional[str]:
         """Extract item from text based on category"""
-        text_lower = text.lower()
+        if text_lower is None:
+            text_lower = text.lower()
         
         # Special cases
         if 'قهوة' in text_lower:
@@ -160,49 +249,53 @@ class TransactionExtractor:
             return 'حاجات متنوعة'
         
         # Pattern-based extraction
-        item_patterns = [
-            r'(?:على|علي)\s+(\w+)',           # على خضار
-            r'(?:من|في)\s+(\w+)',              # من اللحم
-            r'(?:اشتريت|شريت|جبت|اخدت)\s+(\w+)',  # اشتريت خضار
-        ]
-        
-        for pattern in item_patterns:
-            match = re.search(pattern, text_lower)
+        for pattern in _ITEM_PATTERNS:
+            match = pattern.search(text_lower)
             if match:
                 potential_item = match.group(1)
                 # Filter out common words and places
-                excluded = ['في', 'من', 'على', 'ال', 'the', 'a', 'an', 'كارفور', 'ميترو', 
-                           'حاجة', 'جوه', 'للقطر', 'قطر', 'قطار']
-                if potential_item not in excluded:
+                if potential_item not in _EXCLUDED_ITEMS:
                     return potential_item
         
         return None
     
-    def determine_transaction_type(self, text: str) -> TransactionType:
+    def determine_transaction_type(self, text: str,
+                                   roles: Optional[Set[str]] = None) -> TransactionType:
         """Determine if transaction is income or expense"""
-        text_lower = text.lower()
-        
-        is_income = any(keyword in text_lower for keyword in INCOME_KEYWORDS)
-        return TransactionType.INCOME if is_income else TransactionType.EXPENSE
+        if roles is None:
+            roles = segment_roles(text.lower())
+        return TransactionType.INCOME if 'income' in roles else TransactionType.EXPENSE
     
-    def extract_transaction(self, text: str, amount: Optional[float] = None) -> Transaction:
+    def extract_transaction(self, text: str, amount: Optional[float] = None,
+                            roles: Optional[Set[str]] = None,
+                            amounts: Optional[List[Tuple[float, int]]] = None,
+                            text_lower: Optional[str] = None) -> Transaction:
         """Extract complete transaction from text segment"""
-        # If no amount provided, try to extract it
+        # If no amount provided, try to extract it (unless already extracted)
         if amount is None:
-            amounts = extract_amounts_from_text(text)
+            if amounts is None:
+                amounts = extract_amounts_from_text(text)
             amount = amounts[0][0] if amounts else None
         
+        # Lowercase once for every helper, and scan the keyword roles once
+        if text_lower is None:
+            text_lower = text.lower()
+        if roles is None:
+            roles = segment_roles(text_lower)
+        
         # Extract components
-        place = self.extract_place(text)
-        transaction_type = self.determine_transaction_type(text)
-        category = self.classifier.classify(text, place)
-        item = self.extract_item(text, category)
+        place = self.extract_place(text, text_lower)
+        transaction_type = self.determine_transaction_type(text, roles)
+        category = self.classifier.classify(
+            text, place, normalize_arabic_text(text_lower)
+        )
+        item = self.extract_item(text, category, text_lower)
         
         # Calculate confidence score
-        confidence = self._calculate_confidence(text, amount, place, item)
+        confidence = self._calculate_confidence(text, amount, place, item, roles)
         
         return Transaction(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             amount=amount,
             transaction_type=transaction_type,
             category=category,
@@ -213,7 +306,8 @@ class TransactionExtractor:
         )
     
     def _calculate_confidence(self, text: str, amount: Optional[float], 
-                            place: Optional[str], item: Optional[str]) -> float:
+                            place: Optional[str], item: Optional[str],
+                            roles: Optional[Set[str]] = None) -> float:
         """Calculate confidence score for extraction"""
         score = 0.5  # Base score
         
@@ -230,8 +324,9 @@ class TransactionExtractor:
             score += 0.1
         
         # Contains action verbs
-        action_verbs = ['دفعت', 'اشتريت', 'جبت', 'استلمت', 'قبضت']
-        if any(verb in text.lower() for verb in action_verbs):
+        if roles is None:
+            roles = segment_roles(text.lower())
+        if 'confident' in roles:
             score += 0.1
         
         return min(score, 1.0)
@@ -246,16 +341,19 @@ class NLPService:
     @cached_text_analysis(ttl=3600)  # Cache for 1 hour
     async def analyze_text(self, text: str, language: str = "ar") -> AnalysisResult:
         """Analyze text and extract financial information"""
-        start_time = time.time()
+        start_time = time.perf_counter_ns()
         
         try:
             logger.info(f"Analyzing text: {text[:50]}...")
             
+            # Lowercase and normalize the whole text once for every check below
+            text_lower = text.lower()
+            
             # CRITICAL: Filter content for prohibited material
-            content_filter.filter_text(text)
+            content_filter.filter_text(text, text_lower)
             
             # Additional check: Ensure content is financial in nature
-            if not content_filter.is_financial_content(text):
+            if not content_filter.is_financial_content(text, text_lower):
                 raise ValidationError(
                     "Content does not appear to be financial in nature. "
                     "This service is designed for legitimate financial transaction analysis only.",
@@ -266,14 +364,14 @@ class NLPService:
                 )
             
             # Normalize text
-            normalized_text = normalize_arabic_text(text)
+            normalized_lower = normalize_arabic_text(text_lower)
             
             # Detect language if auto
             if language == "auto":
                 language = detect_language(text)
             
             # Extract all amounts
-            all_amounts = extract_amounts_from_text(text)
+            all_amounts = extract_amounts_from_text(text, normalized_lower)
             logger.debug(f"Found {len(all_amounts)} amounts: {[a[0] for a in all_amounts]}")
             
             # Split into segments
@@ -284,20 +382,20 @@ class NLPService:
             transactions = []
             used_amounts = set()
             
+            # Segments are substrings of text, which already passed the content filter
             for segment in segments:
-                # Filter each segment as well
-                try:
-                    content_filter.filter_text(segment)
-                except ValidationError:
-                    logger.warning(f"Skipping prohibited segment: {segment[:30]}...")
-                    continue
+                # Lowercase once; every keyword role of the segment from a single scan
+                segment_lower = segment.lower()
+                roles = segment_roles(segment_lower)
+                
+                # Amounts in this segment, extracted once for every check below
+                segment_amounts = extract_amounts_from_text(segment)
                 
                 # Skip segments that don't represent transactions
-                if not self._is_transaction_segment(segment):
+                if not self._is_transaction_segment(segment, roles, segment_amounts):
                     continue
                 
                 # Find amount for this segment
-                segment_amounts = extract_amounts_from_text(segment)
                 amount = None
                 
                 if segment_amounts:
@@ -305,7 +403,7 @@ class NLPService:
                     used_amounts.add(amount)
                 else:
                     # Assign unused amount if this looks like a spending action
-                    if self._indicates_spending(segment):
+                    if self._indicates_spending(segment, roles):
                         for amt, pos in all_amounts:
                             if amt not in used_amounts:
                                 amount = amt
@@ -313,7 +411,9 @@ class NLPService:
                                 break
                 
                 # Extract transaction
-                transaction = self.extractor.extract_transaction(segment, amount)
+                transaction = self.extractor.extract_transaction(
+                    segment, amount, roles, segment_amounts, segment_lower
+                )
                 
                 # Only include meaningful transactions
                 if self._is_meaningful_transaction(transaction):
@@ -331,7 +431,7 @@ class NLPService:
                         net_amount=0,
                         categories={}
                     ),
-                    processing_time_ms=int((time.time() - start_time) * 1000),
+                    processing_time_ms=(time.perf_counter_ns() - start_time) // 1_000_000,
                     language_detected=language
                 )
             
@@ -339,12 +439,11 @@ class NLPService:
             summary = self._calculate_summary(transactions)
             
             # Calculate processing time
-            processing_time = int((time.time() - start_time) * 1000)
+            processing_time = (time.perf_counter_ns() - start_time) // 1_000_000
             
             # Convert to response format
             transaction_details = [
-                TransactionDetail(**transaction.to_response_model())
-                for transaction in transactions
+                transaction.to_response_detail() for transaction in transactions
             ]
             
             result = AnalysisResult(
@@ -364,21 +463,26 @@ class NLPService:
             logger.error(f"NLP analysis failed: {e}", exc_info=True)
             raise NLPProcessingError(f"Failed to analyze text: {str(e)}")
     
-    def _is_transaction_segment(self, segment: str) -> bool:
+    def _is_transaction_segment(self, segment: str,
+                                roles: Optional[Set[str]] = None,
+                                segment_amounts: Optional[List[Tuple[float, int]]] = None) -> bool:
         """Check if segment represents a transaction"""
-        segment_lower = segment.lower()
+        if roles is None:
+            roles = segment_roles(segment.lower())
+        if segment_amounts is None:
+            segment_amounts = extract_amounts_from_text(segment)
         
         # Must contain action verbs or amounts
-        action_verbs = ['دفعت', 'اشتريت', 'جبت', 'استلمت', 'قبضت', 'صرفت', 'كلت', 'شربت']
-        has_action = any(verb in segment_lower for verb in action_verbs)
-        has_amount = bool(extract_amounts_from_text(segment))
+        has_action = 'action' in roles
+        has_amount = bool(segment_amounts)
         
         return has_action or has_amount
     
-    def _indicates_spending(self, segment: str) -> bool:
+    def _indicates_spending(self, segment: str, roles: Optional[Set[str]] = None) -> bool:
         """Check if segment indicates spending"""
-        spending_verbs = ['دفعت', 'اشتريت', 'جبت', 'صرفت', 'كلت', 'شربت', 'خلصت']
-        return any(verb in segment.lower() for verb in spending_verbs)
+        if roles is None:
+            roles = segment_roles(segment.lower())
+        return 'spending' in roles
     
     def _is_meaningful_transaction(self, transaction: Transaction) -> bool:
         """Check if transaction is meaningful enough to include"""
@@ -391,21 +495,22 @@ class NLPService:
     
     def _calculate_summary(self, transactions: List[Transaction]) -> FinancialSummary:
         """Calculate financial summary"""
-        total_income = sum(
-            t.amount for t in transactions 
-            if t.transaction_type == TransactionType.INCOME and t.amount
-        )
-        
-        total_expenses = sum(
-            t.amount for t in transactions 
-            if t.transaction_type == TransactionType.EXPENSE and t.amount
-        )
-        
-        # Calculate categories
+        total_income = 0
+        total_expenses = 0
         categories = {}
+        
+        # Accumulate totals and per-category amounts in one pass
         for transaction in transactions:
-            if transaction.amount and transaction.category:
-                categories[transaction.category] = categories.get(transaction.category, 0) + transaction.amount
+            amount = transaction.amount
+            if not amount:
+                continue
+            if transaction.transaction_type is TransactionType.INCOME:
+                total_income += amount
+            else:
+                total_expenses += amount
+            category = transaction.category
+            if category:
+                categories[category] = categories.get(category, 0) + amount
         
         return FinancialSummary(
             total_transactions=len(transactions),
@@ -1,19 +1,21 @@
 """
 Transcription service using AssemblyAI
 """
-import asyncio
+import re
 import time
-from concurrent.futures import ThreadPoolExecutor
-from typing import Tuple
+from typing import Optional, Tuple
 import assemblyai as aai
 from app.core.logging import get_logger
 from app.config import settings
 from app.exceptions import TranscriptionError, ValidationError
-from app.utils.cache import cache, get_content_hash
+from app.utils.cache import cache, get_content_hash, single_flight
 from app.utils.content_filter import content_filter
 
 logger = get_logger("transcription_service")
 
+_WHITESPACE_RE = re.compile(r'\s+')
+_ARTIFACT_RE = re.compile(r'\[(?:inaudible|music|noise|silence)\]')
+
 
 class TranscriptionService:
     """AssemblyAI transcription service with async support"""
@@ -21,7 +23,9 @@ class TranscriptionService:
     def __init__(self):
         # Configure AssemblyAI
         aai.settings.api_key = settings.assemblyai_api_key
-        self.executor = ThreadPoolExecutor(max_workers=2)
+        
+        # Created on first use: its connection pool belongs to the running loop
+        self._transcriber: Optional[aai.AsyncTranscriber] = None
         
         # Transcription configuration
         self.config = aai.TranscriptionConfig(
@@ -38,24 +42,30 @@ class TranscriptionService:
     
     async def transcribe_audio(self, audio_path: str, content_hash: str = None) -> Tuple[str, float]:
         """Transcribe audio file and return text with confidence score"""
+        if not content_hash:
+            return await self._transcribe(audio_path)
+        
+        # Check cache first
+        cache_key = f"transcription:{content_hash}"
+        cached_result = cache.get(cache_key)
+        if cached_result:
+            logger.info("Returning cached transcription")
+            return cached_result['text'], cached_result['confidence']
+        
+        # Concurrent uploads of the same audio share a single transcription
+        return await single_flight(
+            cache_key, lambda: self._transcribe(audio_path, cache_key)
+        )
+    
+    async def _transcribe(self, audio_path: str, cache_key: Optional[str] = None) -> Tuple[str, float]:
+        """Transcribe audio file, caching the result under cache_key if given"""
         try:
-            start_time = time.time()
-            
-            # Check cache first
-            if content_hash:
-                cache_key = f"transcription:{content_hash}"
-                cached_result = cache.get(cache_key)
-                if cached_result:
-                    logger.info("Returning cached transcription")
-                    return cached_result['text'], cached_result['confidence']
+            start_time = time.perf_counter()
             
             logger.info(f"Starting transcription for: {audio_path}")
             
-            # Run transcription in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            transcript_obj = await loop.run_in_executor(
-                self.executor, self._transcribe_sync, audio_path
-            )
+            # Upload and poll on the event loop; no worker thread waits on the API
+            transcript_obj = await self._transcribe_remote(audio_path)
             
             # Check for errors
             if transcript_obj.status == aai.TranscriptStatus.error:
@@ -77,11 +87,11 @@ class TranscriptionService:
                     "This service is designed for legitimate financial transactions only."
                 )
             
-            processing_time = time.time() - start_time
+            processing_time = time.perf_counter() - start_time
             logger.info(f"Transcription completed in {processing_time:.2f}s, confidence: {confidence:.2f}")
             
             # Cache result
-            if content_hash:
+            if cache_key:
                 cache.set(cache_key, {
                     'text': text,
                     'confidence': confidence
@@ -95,30 +105,31 @@ class TranscriptionService:
             logger.error(f"Transcription service error: {e}", exc_info=True)
             raise TranscriptionError(f"Transcription service failed: {str(e)}")
     
-    def _transcribe_sync(self, audio_path: str) -> aai.Transcript:
-        """Synchronous transcription"""
+    async def _transcribe_remote(self, audio_path: str) -> aai.AsyncTranscript:
+        """Asynchronous transcription"""
+        if self._transcriber is None:
+            self._transcriber = aai.AsyncTranscriber(config=self.config)
         try:
-            transcriber = aai.Transcriber(config=self.config)
-            return transcriber.transcribe(audio_path)
+            return await self._transcriber.transcribe(audio_path)
         except Exception as e:
             raise TranscriptionError(f"AssemblyAI API error: {str(e)}")
     
+    async def close(self):
+        """Close the AssemblyAI connection pool"""
+        if self._transcriber is not None:
+            await self._transcriber.aclose()
+            self._transcriber = None
+    
     def _clean_transcription(self, text: str) -> str:
         """Clean and normalize transcription text"""
         if not text:
             return ""
         
-        # Basic cleaning
-        text = text.strip()
-        
         # Remove excessive whitespace
-        import re
-        text = re.sub(r'\s+', ' ', text)
+        text = _WHITESPACE_RE.sub(' ', text)
         
         # Remove common transcription artifacts
-        artifacts = ['[inaudible]', '[music]', '[noise]', '[silence]']
-        for artifact in artifacts:
-            text = text.replace(artifact, '')
+        text = _ARTIFACT_RE.sub('', text)
         
         return text.strip()
     
@@ -141,10 +152,6 @@ class TranscriptionService:
             return False
         
         return True
-    
-    async def cleanup(self):
-        """Cleanup resources"""
-        self.executor.shutdown(wait=True)
 
 
 # Global transcription service instance
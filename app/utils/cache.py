@@ -1,56 +1,83 @@
 """
 Caching utilities
 """
+import sys
 import time
+import asyncio
+import heapq
 import hashlib
-from typing import Optional, Any, Dict
+from collections import OrderedDict
+from typing import Optional, Any, Awaitable, Callable, Dict, List, NamedTuple, Tuple
 from functools import wraps
 from app.core.logging import get_logger
 from app.config import settings
 
+# Try to import blake3 (SIMD, multithreaded); fall back to hashlib SHA-256
+try:
+    import blake3
+    HAS_BLAKE3 = True
+except ImportError:
+    HAS_BLAKE3 = False
+
 logger = get_logger("cache")
 
 
+class _Entry(NamedTuple):
+    """A cached value; replaced, never mutated, on set"""
+    expires_at: float  # time.monotonic() deadline
+    value: Any
+    size: int  # shallow size of key and value in bytes
+
+
 class SimpleCache:
-    """Simple in-memory cache with TTL support"""
+    """
+    Simple in-memory LRU cache with TTL support
+    
+    Entries expire on the monotonic clock and are kept in
+    least-recently-used order so eviction pops from the front. Expiry is
+    checked on get(); expired entries nobody reads again are swept every
+    `sweep_interval` sets using a min-heap of expiry times.
+    """
     
     def __init__(self, max_size: int = 1000, default_ttl: int = 3600):
-        self.cache: Dict[str, Dict[str, Any]] = {}
+        self.cache: "OrderedDict[str, _Entry]" = OrderedDict()
         self.max_size = max_size
         self.default_ttl = default_ttl
+        self.sweep_interval = max(128, max_size // 8)
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._sets_since_sweep = 0
+        # Shallow size of keys and values, kept up to date on every insert/removal
+        self._estimated_bytes = 0
+    
+    def _remove(self, key: str) -> None:
+        """Remove an entry and its share of the size estimate"""
+        self._estimated_bytes -= self.cache.pop(key).size
     
-    def _is_expired(self, entry: Dict[str, Any]) -> bool:
+    def _is_expired(self, entry: _Entry) -> bool:
         """Check if cache entry is expired"""
-        return time.time() > entry['expires_at']
+        return time.monotonic() > entry.expires_at
     
     def _cleanup_expired(self):
         """Remove expired entries"""
-        current_time = time.time()
-        expired_keys = [
-            key for key, entry in self.cache.items()
-            if current_time > entry['expires_at']
-        ]
+        current_time = time.monotonic()
+        heap = self._expiry_heap
+        removed = 0
         
-        for key in expired_keys:
-            del self.cache[key]
+        while heap and current_time > heap[0][0]:
+            expires_at, key = heapq.heappop(heap)
+            entry = self.cache.get(key)
+            # Skip records of keys since overwritten, evicted or deleted
+            if entry is not None and entry.expires_at == expires_at:
+                self._remove(key)
+                removed += 1
         
-        if expired_keys:
-            logger.debug(f"Cleaned up {len(expired_keys)} expired cache entries")
-    
-    def _evict_oldest(self):
-        """Evict oldest entries if cache is full"""
-        if len(self.cache) >= self.max_size:
-            # Remove 10% of oldest entries
-            entries_to_remove = max(1, len(self.cache) // 10)
-            oldest_keys = sorted(
-                self.cache.keys(),
-                key=lambda k: self.cache[k]['created_at']
-            )[:entries_to_remove]
-            
-            for key in oldest_keys:
-                del self.cache[key]
-            
-            logger.debug(f"Evicted {len(oldest_keys)} oldest cache entries")
+        # Stale records pile up when keys are overwritten; rebuild from live entries
+        if len(heap) > 2 * self.max_size:
+            self._expiry_heap = [(entry.expires_at, key) for key, entry in self.cache.items()]
+            heapq.heapify(self._expiry_heap)
+        
+        if removed:
+            logger.debug(f"Cleaned up {removed} expired cache entries")
     
     def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
@@ -60,41 +87,45 @@ class SimpleCache:
         entry = self.cache[key]
         
         if self._is_expired(entry):
-            del self.cache[key]
+            self._remove(key)
             return None
         
-        # Update access time
-        entry['last_accessed'] = time.time()
+        # Mark as most recently used
+        self.cache.move_to_end(key)
         
         logger.debug(f"Cache hit for key: {key[:20]}...")
-        return entry['value']
+        return entry.value
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
         """Set value in cache"""
         if ttl is None:
             ttl = self.default_ttl
         
-        current_time = time.time()
+        # Sweep expired entries periodically rather than on every set
+        self._sets_since_sweep += 1
+        if self._sets_since_sweep >= self.sweep_interval:
+            self._sets_since_sweep = 0
+            self._cleanup_expired()
         
-        # Cleanup expired entries
-        self._cleanup_expired()
+        if key in self.cache:
+            self._remove(key)
         
-        # Evict if necessary
-        self._evict_oldest()
+        expires_at = time.monotonic() + ttl
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        self.cache[key] = _Entry(expires_at, value, size)
+        self._estimated_bytes += size
+        heapq.heappush(self._expiry_heap, (expires_at, key))
         
-        self.cache[key] = {
-            'value': value,
-            'created_at': current_time,
-            'last_accessed': current_time,
-            'expires_at': current_time + ttl
-        }
+        # Evict least recently used entries if over capacity
+        while len(self.cache) > self.max_size:
+            self._estimated_bytes -= self.cache.popitem(last=False)[1].size
         
         logger.debug(f"Cache set for key: {key[:20]}... (TTL: {ttl}s)")
     
     def delete(self, key: str) -> bool:
         """Delete key from cache"""
         if key in self.cache:
-            del self.cache[key]
+            self._remove(key)
             logger.debug(f"Cache delete for key: {key[:20]}...")
             return True
         return False
@@ -102,14 +133,17 @@ class SimpleCache:
     def clear(self) -> None:
         """Clear all cache entries"""
         self.cache.clear()
+        self._expiry_heap.clear()
+        self._sets_since_sweep = 0
+        self._estimated_bytes = 0
         logger.debug("Cache cleared")
     
     def stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
-        current_time = time.time()
+        current_time = time.monotonic()
         expired_count = sum(
             1 for entry in self.cache.values()
-            if current_time > entry['expires_at']
+            if current_time > entry.expires_at
         )
         
         return {
@@ -117,7 +151,7 @@ class SimpleCache:
             'expired_entries': expired_count,
             'active_entries': len(self.cache) - expired_count,
             'max_size': self.max_size,
-            'memory_usage_estimate': len(str(self.cache))
+            'memory_usage_estimate': self._estimated_bytes
         }
 
 
@@ -128,19 +162,65 @@ cache = SimpleCache(
 )
 
 
+# Computations currently running, by cache key
+_inflight: Dict[str, "asyncio.Future"] = {}
+
+
+async def single_flight(key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Run compute() once for concurrent callers with the same key
+    
+    The first caller runs it; callers arriving meanwhile await its result
+    (or exception) instead of repeating the work. If the first caller is
+    cancelled, a waiter runs compute() itself.
+    """
+    future = _inflight.get(key)
+    if future is not None:
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            task = asyncio.current_task()
+            if not future.cancelled() or (task is not None and task.cancelling()):
+                raise
+            return await compute()
+    
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        result = await compute()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        # Mark retrieved so an exception with no waiters isn't reported as lost
+        future.exception()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        _inflight.pop(key, None)
+
+
 def cache_key_for_text(text: str, language: str = "ar") -> str:
     """Generate cache key for text analysis"""
-    content = f"{text}:{language}"
-    return f"text_analysis:{hashlib.sha256(content.encode()).hexdigest()}"
+    content = f"{text}:{language}".encode()
+    if HAS_BLAKE3:
+        digest = blake3.blake3(content).hexdigest(length=16)
+    else:
+        digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+    return f"text_analysis:{digest}"
 
 
 def cached_text_analysis(ttl: int = None):
-    """Decorator for caching text analysis results"""
+    """Decorator for caching text analysis results of a (self, text, language) method"""
     def decorator(func):
         @wraps(func)
-        async def wrapper(text: str, *args, **kwargs):
-            # Generate cache key
-            cache_key = cache_key_for_text(text, kwargs.get('language', 'ar'))
+        async def wrapper(self, text: str, *args, **kwargs):
+            # Generate cache key (language may be passed positionally)
+            language = args[0] if args else kwargs.get('language', 'ar')
+            cache_key = cache_key_for_text(text, language)
             
             # Try to get from cache
             cached_result = cache.get(cache_key)
@@ -148,13 +228,13 @@ def cached_text_analysis(ttl: int = None):
                 logger.info(f"Returning cached analysis for text: {text[:30]}...")
                 return cached_result
             
-            # Execute function
-            result = await func(text, *args, **kwargs)
-            
-            # Cache result
-            cache.set(cache_key, result, ttl)
+            async def compute():
+                result = await func(self, text, *args, **kwargs)
+                cache.set(cache_key, result, ttl)
+                return result
             
-            return result
+            # Identical requests arriving meanwhile share this computation
+            return await single_flight(cache_key, compute)
         return wrapper
     return decorator
 
@@ -164,6 +244,15 @@ def cache_key_for_audio(content_hash: str, filename: str) -> str:
     return f"audio_analysis:{content_hash}:{filename}"
 
 
+def new_content_hasher():
+    """Incremental hasher for file content (update()/hexdigest() interface)"""
+    if HAS_BLAKE3:
+        return blake3.blake3(max_threads=blake3.blake3.AUTO)
+    return hashlib.sha256()
+
+
 def get_content_hash(content: bytes) -> str:
     """Generate hash for content"""
-    return hashlib.sha256(content).hexdigest()[:16]  # First 16 chars for brevity
\ No newline at end of file
+    hasher = new_content_hasher()
+    hasher.update(content)
+    return hasher.hexdigest()[:16]  # First 16 chars for brevity
\ No newline at end of file
@@ -1,66 +1,99 @@
 """
 Content filtering utilities to prevent processing of illegal or harmful content
 """
-import re
 from typing import List, Tuple, Optional
 from app.core.logging import get_logger
 from app.exceptions import ValidationError
+from app.utils.keyword_matcher import KeywordMatcher
 
 logger = get_logger("content_filter")
 
 
+def _is_word_char(char: str) -> bool:
+    """Same test as the regex \\w class on str patterns"""
+    return char.isalnum() or char == '_'
+
+
+def _at_word_boundary(text: str, index: int) -> bool:
+    """Same test as the regex \\b assertion at text[index]"""
+    before = index > 0 and _is_word_char(text[index - 1])
+    after = index < len(text) and _is_word_char(text[index])
+    return before != after
+
+
+# Illegal substances (Arabic and English)
+_ILLEGAL_SUBSTANCES = (
+    # Arabic terms
+    'حشيش', 'حشيشة', 'بانجو', 'ماريجوانا', 'كوكايين', 'هيروين', 'أفيون', 'ترامادول',
+    'كبتاجون', 'إكستاسي', 'مخدرات', 'مخدر', 'مواد مخدرة', 'تجارة المخدرات',
+    'بيع المخدرات', 'شراء المخدرات', 'تهريب المخدرات', 'مروج مخدرات',
+    # English terms
+    'drugs', 'cocaine', 'heroin', 'marijuana', 'cannabis', 'hashish', 'opium',
+    'ecstasy', 'methamphetamine', 'drug dealing', 'drug trafficking', 'drug trade',
+    'illegal drugs', 'narcotics', 'drug dealer', 'drug pusher'
+)
+
+# Illegal activities
+_ILLEGAL_ACTIVITIES = (
+    # Arabic terms
+    'غسيل أموال', 'غسيل الأموال', 'تبييض أموال', 'أموال مشبوهة', 'رشوة', 'فساد',
+    'تهرب ضريبي', 'تجارة أسلحة', 'تهريب', 'احتيال', 'نصب', 'سرقة', 'اختلاس',
+    'تزوير', 'تزييف', 'قتل', 'اغتيال', 'خطف', 'اتجار بالبشر', 'دعارة', 'بغاء',
+    # English terms
+    'money laundering', 'tax evasion', 'bribery', 'corruption', 'fraud', 'theft',
+    'embezzlement', 'forgery', 'counterfeiting', 'murder', 'assassination',
+    'kidnapping', 'human trafficking', 'prostitution', 'arms dealing', 'smuggling'
+)
+
+# Weapons and explosives
+_WEAPONS_EXPLOSIVES = (
+    # Arabic terms
+    'أسلحة', 'سلاح', 'مسدس', 'بندقية', 'رشاش', 'قنابل', 'قنبلة', 'متفجرات',
+    'ديناميت', 'تي إن تي', 'C4', 'أسلحة نارية', 'ذخيرة', 'رصاص',
+    # English terms
+    'weapons', 'gun', 'pistol', 'rifle', 'machine gun', 'bomb', 'explosive',
+    'dynamite', 'TNT', 'ammunition', 'bullets', 'firearms', 'grenades'
+)
+
+# Combine all prohibited terms
+_PROHIBITED_TERMS = _ILLEGAL_SUBSTANCES + _ILLEGAL_ACTIVITIES + _WEAPONS_EXPLOSIVES
+
+# Built once per process at import and shared by every ContentFilter. Each
+# term is its own tag so the regex fallback still finds a term nested in a
+# longer one that fails the word-boundary check
+_PROHIBITED_MATCHER = KeywordMatcher((term, term) for term in _PROHIBITED_TERMS)
+
+
+# Terms marking a text as financial
+_FINANCIAL_INDICATORS = (
+    # Arabic financial terms
+    'جنيه', 'دولار', 'ريال', 'دفعت', 'اشتريت', 'مرتب', 'راتب', 'فاتورة',
+    'كارفور', 'سبينس', 'ميترو', 'مطعم', 'سوبر ماركت', 'صيدلية', 'بنزين',
+    'مواصلات', 'تاكسي', 'قطار', 'مترو', 'كهرباء', 'مياه', 'انترنت',
+    # English financial terms
+    'pound', 'dollar', 'paid', 'bought', 'salary', 'bill', 'restaurant',
+    'supermarket', 'pharmacy', 'gas', 'transport', 'taxi', 'electricity'
+)
+_FINANCIAL_MATCHER = KeywordMatcher((term, 'financial') for term in _FINANCIAL_INDICATORS)
+
+
 class ContentFilter:
     """Filter for detecting and blocking inappropriate content"""
     
+    __slots__ = (
+        'illegal_substances', 'illegal_activities', 'weapons_explosives',
+        'prohibited_terms', 'prohibited_matcher'
+    )
+    
     def __init__(self):
-        # Illegal substances and activities (Arabic and English)
-        self.illegal_substances = [
-            # Arabic terms
-            'حشيش', 'حشيشة', 'بانجو', 'ماريجوانا', 'كوكايين', 'هيروين', 'أفيون', 'ترامادول',
-            'كبتاجون', 'إكستاسي', 'مخدرات', 'مخدر', 'مواد مخدرة', 'تجارة المخدرات',
-            'بيع المخدرات', 'شراء المخدرات', 'تهريب المخدرات', 'مروج مخدرات',
-            # English terms
-            'drugs', 'cocaine', 'heroin', 'marijuana', 'cannabis', 'hashish', 'opium',
-            'ecstasy', 'methamphetamine', 'drug dealing', 'drug trafficking', 'drug trade',
-            'illegal drugs', 'narcotics', 'drug dealer', 'drug pusher'
-        ]
-        
-        # Illegal activities
-        self.illegal_activities = [
-            # Arabic terms
-            'غسيل أموال', 'غسيل الأموال', 'تبييض أموال', 'أموال مشبوهة', 'رشوة', 'فساد',
-            'تهرب ضريبي', 'تجارة أسلحة', 'تهريب', 'احتيال', 'نصب', 'سرقة', 'اختلاس',
-            'تزوير', 'تزييف', 'قتل', 'اغتيال', 'خطف', 'اتجار بالبشر', 'دعارة', 'بغاء',
-            # English terms
-            'money laundering', 'tax evasion', 'bribery', 'corruption', 'fraud', 'theft',
-            'embezzlement', 'forgery', 'counterfeiting', 'murder', 'assassination',
-            'kidnapping', 'human trafficking', 'prostitution', 'arms dealing', 'smuggling'
-        ]
-        
-        # Weapons and explosives
-        self.weapons_explosives = [
-            # Arabic terms
-            'أسلحة', 'سلاح', 'مسدس', 'بندقية', 'رشاش', 'قنابل', 'قنبلة', 'متفجرات',
-            'ديناميت', 'تي إن تي', 'C4', 'أسلحة نارية', 'ذخيرة', 'رصاص',
-            # English terms
-            'weapons', 'gun', 'pistol', 'rifle', 'machine gun', 'bomb', 'explosive',
-            'dynamite', 'TNT', 'ammunition', 'bullets', 'firearms', 'grenades'
-        ]
-        
-        # Combine all prohibited terms
-        self.prohibited_terms = (
-            self.illegal_substances + 
-            self.illegal_activities + 
-            self.weapons_explosives
-        )
-        
-        # Compile regex patterns for efficient matching
-        self.prohibited_patterns = [
-            re.compile(r'\b' + re.escape(term) + r'\b', re.IGNORECASE)
-            for term in self.prohibited_terms
-        ]
+        self.illegal_substances = _ILLEGAL_SUBSTANCES
+        self.illegal_activities = _ILLEGAL_ACTIVITIES
+        self.weapons_explosives = _WEAPONS_EXPLOSIVES
+        self.prohibited_terms = _PROHIBITED_TERMS
+        self.prohibited_matcher = _PROHIBITED_MATCHER
     
-    def check_content(self, text: str) -> Tuple[bool, List[str]]:
+    def check_content(self, text: str,
+                      text_lower: Optional[str] = None) -> Tuple[bool, List[str]]:
         """
         Check if content contains prohibited terms
         
@@ -70,13 +103,16 @@ class ContentFilter:
         if not text:
             return True, []
         
-        found_terms = []
-        text_lower = text.lower()
+        if text_lower is None:
+            text_lower = text.lower()
         
-        for pattern in self.prohibited_patterns:
-            matches = pattern.findall(text)
-            if matches:
-                found_terms.extend(matches)
+        # Whole-word matches only
+        found_terms = [
+            keyword
+            for start, keyword, _ in self.prohibited_matcher.iter(text_lower)
+            if _at_word_boundary(text_lower, start)
+            and _at_word_boundary(text_lower, start + len(keyword))
+        ]
         
         is_safe = len(found_terms) == 0
         
@@ -85,12 +121,13 @@ class ContentFilter:
         
         return is_safe, found_terms
     
-    def filter_text(self, text: str) -> str:
+    def filter_text(self, text: str, text_lower: Optional[str] = None) -> str:
         """
         Filter text by raising an exception if prohibited content is found
         
         Args:
             text: Text to check
+            text_lower: text.lower(), if the caller already has it
             
         Returns:
             Original text if safe
@@ -98,7 +135,7 @@ class ContentFilter:
         Raises:
             ValidationError: If prohibited content is detected
         """
-        is_safe, found_terms = self.check_content(text)
+        is_safe, found_terms = self.check_content(text, text_lower)
         
         if not is_safe:
             raise ValidationError(
@@ -112,31 +149,21 @@ class ContentFilter:
         
         return text
     
-    def is_financial_content(self, text: str) -> bool:
+    def is_financial_content(self, text: str, text_lower: Optional[str] = None) -> bool:
         """
         Check if text appears to be legitimate financial content
         
         Args:
             text: Text to analyze
+            text_lower: text.lower(), if the caller already has it
             
         Returns:
             True if content appears to be financial in nature
         """
-        financial_indicators = [
-            # Arabic financial terms
-            'جنيه', 'دولار', 'ريال', 'دفعت', 'اشتريت', 'مرتب', 'راتب', 'فاتورة',
-            'كارفور', 'سبينس', 'ميترو', 'مطعم', 'سوبر ماركت', 'صيدلية', 'بنزين',
-            'مواصلات', 'تاكسي', 'قطار', 'مترو', 'كهرباء', 'مياه', 'انترنت',
-            # English financial terms
-            'pound', 'dollar', 'paid', 'bought', 'salary', 'bill', 'restaurant',
-            'supermarket', 'pharmacy', 'gas', 'transport', 'taxi', 'electricity'
-        ]
-        
-        text_lower = text.lower()
-        financial_matches = sum(1 for term in financial_indicators if term in text_lower)
-        
-        # Consider it financial if it has at least 1 financial indicator
-        return financial_matches > 0
+        # Financial if it has at least 1 financial indicator; stops at the first
+        if text_lower is None:
+            text_lower = text.lower()
+        return _FINANCIAL_MATCHER.search(text_lower)
 
 
 # Global content filter instance
@@ -4,25 +4,38 @@ File handling utilities
 import os
 import tempfile
 import secrets
+import weakref
 from typing import Optional, Tuple
 from contextlib import asynccontextmanager
+from fastapi import UploadFile
 from app.core.logging import get_logger
 from app.core.security import SecurityUtils
-from app.exceptions import FileValidationError
+from app.utils.cache import new_content_hasher
+from app.exceptions import FileValidationError, ValidationError
 
 logger = get_logger("file_utils")
 
 
+def _remove_temp_file(file_path: str):
+    """Remove a temp file and its directory; a no-op once they are gone"""
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    try:
+        os.rmdir(os.path.dirname(file_path))
+    except OSError:
+        pass
+
+
 class SecureFileHandler:
     """Secure file handling with automatic cleanup"""
     
-    def __init__(self):
-        self.temp_files = set()
-    
     @asynccontextmanager
     async def create_temp_file(self, content: bytes, original_filename: str):
         """Create a secure temporary file with automatic cleanup"""
         temp_path = None
+        finalizer = None
         try:
             # Validate file content
             if not SecurityUtils.validate_audio_file_content(content, original_filename):
@@ -45,7 +58,8 @@ class SecureFileHandler:
             # Set restrictive permissions
             os.chmod(temp_path, 0o600)
             
-            self.temp_files.add(temp_path)
+            # Failsafe if the finally below never runs; fires at exit at the latest
+            finalizer = weakref.finalize(self, _remove_temp_file, temp_path)
             logger.debug(f"Created secure temp file: {temp_path}")
             
             yield temp_path
@@ -54,25 +68,84 @@ class SecureFileHandler:
             logger.error(f"Error creating temp file: {e}")
             raise
         finally:
-            # Cleanup
+            # Cleanup; detach the failsafe so finalizers don't pile up
+            if finalizer:
+                finalizer.detach()
+            if temp_path:
+                await self.cleanup_file(temp_path)
+    
+    @asynccontextmanager
+    async def create_temp_file_from_upload(self, upload: UploadFile, max_size: int,
+                                           chunk_size: int = 1024 * 1024):
+        """
+        Stream an upload into a secure temporary file with automatic cleanup
+        
+        The upload is copied chunk by chunk, so only one chunk is held in memory;
+        size limit, content hash and magic-byte validation are done on the way.
+        
+        Yields:
+            Tuple of (temp_path, size_bytes, content_hash)
+        """
+        temp_path = None
+        finalizer = None
+        try:
+            original_filename = upload.filename
+            if not original_filename:
+                raise ValidationError("No file provided", field="file")
+            temp_dir = tempfile.mkdtemp(prefix="finance_analyzer_")
+            secure_filename = SecurityUtils.generate_secure_filename(original_filename)
+            temp_path = os.path.join(temp_dir, secure_filename)
+            finalizer = weakref.finalize(self, _remove_temp_file, temp_path)
+            
+            hasher = new_content_hasher()
+            header = b""
+            size = 0
+            
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                while chunk := await upload.read(chunk_size):
+                    size += len(chunk)
+                    if size > max_size:
+                        raise ValidationError(
+                            f"File too large. Maximum size: {max_size / 1024 / 1024}MB",
+                            field="file"
+                        )
+                    if len(header) < SecurityUtils.MAGIC_HEADER_SIZE:
+                        header += chunk[:SecurityUtils.MAGIC_HEADER_SIZE - len(header)]
+                    hasher.update(chunk)
+                    f.write(chunk)
+            
+            # Validate file content
+            if not SecurityUtils.validate_audio_file_content(header, original_filename, size):
+                raise FileValidationError(
+                    f"Invalid audio file content: {original_filename}",
+                    filename=original_filename
+                )
+            
+            logger.debug(f"Streamed upload to secure temp file: {temp_path}")
+            
+            yield temp_path, size, hasher.hexdigest()[:16]
+            
+        except Exception as e:
+            logger.error(f"Error creating temp file: {e}")
+            raise
+        finally:
+            # Cleanup; detach the failsafe so finalizers don't pile up
+            if finalizer:
+                finalizer.detach()
             if temp_path:
                 await self.cleanup_file(temp_path)
     
     async def cleanup_file(self, file_path: str):
-        """Securely cleanup a temporary file"""
+        """Cleanup a temporary file"""
         try:
+            # No overwrite before deletion: on journaling/copy-on-write
+            # filesystems and SSDs it doesn't reach the original blocks, and it
+            # cost a full write of every upload. Temp files live in 0700 mkdtemp dirs.
             if os.path.exists(file_path):
-                # Overwrite file content before deletion (security best practice)
-                file_size = os.path.getsize(file_path)
-                with open(file_path, 'wb') as f:
-                    f.write(os.urandom(file_size))
-                
                 os.remove(file_path)
                 logger.debug(f"Cleaned up temp file: {file_path}")
             
-            # Remove from tracking
-            self.temp_files.discard(file_path)
-            
             # Try to remove parent directory if empty
             parent_dir = os.path.dirname(file_path)
             try:
@@ -83,11 +156,6 @@ class SecureFileHandler:
                 
         except Exception as e:
             logger.warning(f"Failed to cleanup file {file_path}: {e}")
-    
-    async def cleanup_all(self):
-        """Cleanup all tracked temporary files"""
-        for file_path in list(self.temp_files):
-            await self.cleanup_file(file_path)
 
 
 def validate_file_extension(filename: str, allowed_extensions: set) -> bool:
@@ -99,12 +167,12 @@ def validate_file_extension(filename: str, allowed_extensions: set) -> bool:
     return ext in allowed_extensions
 
 
-def get_file_info(content: bytes, filename: str) -> dict:
+def get_file_info(size_bytes: int, filename: str) -> dict:
     """Get file information"""
     return {
         "filename": filename,
-        "size_bytes": len(content),
-        "size_mb": round(len(content) / (1024 * 1024), 2),
+        "size_bytes": size_bytes,
+        "size_mb": round(size_bytes / (1024 * 1024), 2),
         "extension": os.path.splitext(filename)[1].lower()
     }
 
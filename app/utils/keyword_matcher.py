@@ -0,0 +1,74 @@
+"""
+Multi-keyword substring matching
+"""
+import re
+from typing import Dict, Generic, Hashable, Iterable, Iterator, List, Set, Tuple, TypeVar
+
+# Try to import pyahocorasick, fall back to regex alternations without it
+try:
+    import ahocorasick
+    HAS_AHOCORASICK = True
+except ImportError:
+    HAS_AHOCORASICK = False
+
+T = TypeVar("T", bound=Hashable)
+
+
+class KeywordMatcher(Generic[T]):
+    """
+    Find every tagged keyword occurring in a text in a single scan
+
+    Matching is plain substring matching (the same as `keyword in text`);
+    keywords are lowercased at build time, so callers pass lowercased text.
+    A keyword may carry several tags.
+    """
+
+    def __init__(self, tagged_keywords: Iterable[Tuple[str, T]]):
+        self._tags_by_keyword: Dict[str, List[T]] = {}
+        for keyword, tag in tagged_keywords:
+            tags = self._tags_by_keyword.setdefault(keyword.lower(), [])
+            if tag not in tags:
+                tags.append(tag)
+
+        if HAS_AHOCORASICK:
+            self._automaton = ahocorasick.Automaton()
+            for keyword, tags in self._tags_by_keyword.items():
+                self._automaton.add_word(keyword, (keyword, tuple(tags)))
+            if self._tags_by_keyword:
+                self._automaton.make_automaton()
+        else:
+            # One alternation per tag so overlapping keywords of different tags
+            # are all found; longest first so iter() reports the longer keyword
+            keywords_by_tag: Dict[T, List[str]] = {}
+            for keyword, tags in self._tags_by_keyword.items():
+                for tag in tags:
+                    keywords_by_tag.setdefault(tag, []).append(keyword)
+            self._patterns = [
+                (tag, re.compile('|'.join(
+                    re.escape(kw) for kw in sorted(keywords, key=len, reverse=True)
+                )))
+                for tag, keywords in keywords_by_tag.items()
+            ]
+
+    def iter(self, text: str) -> Iterator[Tuple[int, str, T]]:
+        """Yield (start, keyword, tag) for each keyword occurrence"""
+        if not text or not self._tags_by_keyword:
+            return
+
+        if HAS_AHOCORASICK:
+            for end, (keyword, tags) in self._automaton.iter(text):
+                start = end - len(keyword) + 1
+                for tag in tags:
+                    yield start, keyword, tag
+        else:
+            for tag, pattern in self._patterns:
+                for match in pattern.finditer(text):
+                    yield match.start(), match.group(), tag
+
+    def tags(self, text: str) -> Set[T]:
+        """Tags of all keywords found in text"""
+        return {tag for _, _, tag in self.iter(text)}
+
+    def search(self, text: str) -> bool:
+        """True if any keyword occurs in text"""
+        return next(self.iter(text), None) is not None
@@ -2,86 +2,94 @@
 Text processing utilities
 """
 import re
-from typing import List, Tuple
+from operator import itemgetter
+from typing import List, Optional, Tuple
 from app.core.logging import get_logger
+from app.config import CURRENCY_RE
 
 logger = get_logger("text_utils")
 
+# Every single-character normalization, applied in one str.translate pass
+_ARABIC_NORMALIZATION = str.maketrans({
+    # Arabic-Indic digits, and the extended variant used in some regions
+    **{arabic: eng for arabic, eng in zip('٠١٢٣٤٥٦٧٨٩', '0123456789')},
+    **{arabic: eng for arabic, eng in zip('۰۱۲۳۴۵۶۷۸۹', '0123456789')},
+    # Arabic decimal separators
+    '٫': '.', '،': ',',
+    # Arabic characters
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ة': 'ه', 'ى': 'ي',
+    # Diacritics are removed
+    **dict.fromkeys('ًٌٍَُِّْ'),
+})
+
 
 def normalize_arabic_text(text: str) -> str:
     """Normalize Arabic text for better processing"""
     if not text:
         return ""
     
-    # Arabic-Indic digits
-    arabic_indic = '٠١٢٣٤٥٦٧٨٩'
-    # Extended Arabic-Indic (used in some regions)
-    extended_arabic = '۰۱۲۳۴۵۶۷۸۹'
-    english = '0123456789'
-    
-    # Convert both variants
-    for arabic, eng in zip(arabic_indic + extended_arabic, english * 2):
-        text = text.replace(arabic, eng)
-    
-    # Handle Arabic decimal separators
-    text = text.replace('٫', '.').replace('،', ',')
-    
-    # Normalize Arabic characters
-    text = text.replace('أ', 'ا').replace('إ', 'ا').replace('آ', 'ا')
-    text = text.replace('ة', 'ه').replace('ى', 'ي')
-    
-    # Remove diacritics
-    diacritics = 'ًٌٍَُِّْ'
-    for diacritic in diacritics:
-        text = text.replace(diacritic, '')
-    
-    return text
+    return text.translate(_ARABIC_NORMALIZATION)
+
 
+# Bare numbers, with an optional thousands or decimal separator
+_STANDALONE_NUMBER_RE = re.compile(r'(\d+(?:[,.]?\d+)?)')
 
-def extract_amounts_from_text(text: str) -> List[Tuple[float, int]]:
-    """Extract all amounts from text with their positions"""
-    original_text = text
-    text = normalize_arabic_text(text)
-    text_lower = text.lower()
+
+# Enhanced Arabic number words dictionary
+_NUMBER_WORDS = {
+    # Units (1-9)
+    'واحد': 1, 'واحدة': 1, 'اتنين': 2, 'اثنين': 2, 'اثنان': 2, 'تنين': 2,
+    'ثلاثة': 3, 'تلاتة': 3, 'تلاته': 3, 'ثلاث': 3,
+    'اربعة': 4, 'اربع': 4, 'أربعة': 4, 'أربع': 4, 'اربعه': 4,
+    'خمسة': 5, 'خمس': 5, 'خمسه': 5,
+    'ستة': 6, 'ست': 6, 'سته': 6,
+    'سبعة': 7, 'سبع': 7, 'سبعه': 7,
+    'ثمانية': 8, 'تمانية': 8, 'ثمان': 8, 'تمان': 8, 'تمانيه': 8,
+    'تسعة': 9, 'تسع': 9, 'تسعه': 9,
+    # Tens (10-90)
+    'عشرة': 10, 'عشر': 10, 'عشره': 10,
+    'عشرين': 20, 'عشرون': 20,
+    'ثلاثين': 30, 'ثلاثون': 30, 'تلاتين': 30, 'تلاتون': 30,
+    'اربعين': 40, 'اربعون': 40, 'أربعين': 40,
+    'خمسين': 50, 'خمسون': 50,
+    'ستين': 60, 'ستون': 60,
+    'سبعين': 70, 'سبعون': 70,
+    'ثمانين': 80, 'ثمانون': 80, 'تمانين': 80, 'تمانون': 80,
+    'تسعين': 90, 'تسعون': 90,
+    # Hundreds
+    'مية': 100, 'ميه': 100, 'مائة': 100, 'مئة': 100, 'مائه': 100,
+    'ميتين': 200, 'مئتين': 200, 'مائتين': 200, 'ميتان': 200,
+    'تلتمية': 300, 'ثلثمائة': 300, 'تلاتمية': 300,
+    'اربعمية': 400, 'أربعمائة': 400, 'اربعمائة': 400,
+    'خمسمية': 500, 'خمسمائة': 500, 'خمسميه': 500,
+    'ستمية': 600, 'ستمائة': 600,
+    'سبعمية': 700, 'سبعمائة': 700,
+    'تمنمية': 800, 'ثمانمائة': 800, 'تمانمية': 800,
+    'تسعمية': 900, 'تسعمائة': 900,
+    # Thousands
+    'الف': 1000, 'ألف': 1000, 'الاف': 1000, 'آلاف': 1000,
+    'الفين': 2000, 'ألفين': 2000, 'الفان': 2000, 'ألفان': 2000,
+}
+
+# Anything but word characters and whitespace, stripped from number words
+_NON_WORD_RE = re.compile(r'[^\w\s]')
+
+
+def extract_amounts_from_text(text: str,
+                              normalized_lower: Optional[str] = None) -> List[Tuple[float, int]]:
+    """
+    Extract all amounts from text with their positions
+    
+    normalized_lower, if the caller already has it, is
+    normalize_arabic_text(text.lower()); normalization only maps caseless
+    characters, so this matches lowercasing after normalization.
+    """
+    if normalized_lower is None:
+        normalized_lower = normalize_arabic_text(text).lower()
+    text_lower = normalized_lower
     
     amounts = []  # List of (amount, position) tuples
     
-    # Enhanced Arabic number words dictionary
-    number_words = {
-        # Units (1-9)
-        'واحد': 1, 'واحدة': 1, 'اتنين': 2, 'اثنين': 2, 'اثنان': 2, 'تنين': 2,
-        'ثلاثة': 3, 'تلاتة': 3, 'تلاته': 3, 'ثلاث': 3,
-        'اربعة': 4, 'اربع': 4, 'أربعة': 4, 'أربع': 4, 'اربعه': 4,
-        'خمسة': 5, 'خمس': 5, 'خمسه': 5,
-        'ستة': 6, 'ست': 6, 'سته': 6,
-        'سبعة': 7, 'سبع': 7, 'سبعه': 7,
-        'ثمانية': 8, 'تمانية': 8, 'ثمان': 8, 'تمان': 8, 'تمانيه': 8,
-        'تسعة': 9, 'تسع': 9, 'تسعه': 9,
-        # Tens (10-90)
-        'عشرة': 10, 'عشر': 10, 'عشره': 10,
-        'عشرين': 20, 'عشرون': 20,
-        'ثلاثين': 30, 'ثلاثون': 30, 'تلاتين': 30, 'تلاتون': 30,
-        'اربعين': 40, 'اربعون': 40, 'أربعين': 40,
-        'خمسين': 50, 'خمسون': 50,
-        'ستين': 60, 'ستون': 60,
-        'سبعين': 70, 'سبعون': 70,
-        'ثمانين': 80, 'ثمانون': 80, 'تمانين': 80, 'تمانون': 80,
-        'تسعين': 90, 'تسعون': 90,
-        # Hundreds
-        'مية': 100, 'ميه': 100, 'مائة': 100, 'مئة': 100, 'مائه': 100,
-        'ميتين': 200, 'مئتين': 200, 'مائتين': 200, 'ميتان': 200,
-        'تلتمية': 300, 'ثلثمائة': 300, 'تلاتمية': 300,
-        'اربعمية': 400, 'أربعمائة': 400, 'اربعمائة': 400,
-        'خمسمية': 500, 'خمسمائة': 500, 'خمسميه': 500,
-        'ستمية': 600, 'ستمائة': 600,
-        'سبعمية': 700, 'سبعمائة': 700,
-        'تمنمية': 800, 'ثمانمائة': 800, 'تمانمية': 800,
-        'تسعمية': 900, 'تسعمائة': 900,
-        # Thousands
-        'الف': 1000, 'ألف': 1000, 'الاف': 1000, 'آلاف': 1000,
-        'الفين': 2000, 'ألفين': 2000, 'الفان': 2000, 'ألفان': 2000,
-    }
-    
     # Extract from Arabic word numbers
     words = text_lower.split()
     word_positions = []
@@ -94,29 +102,30 @@ def extract_amounts_from_text(text: str) -> List[Tuple[float, int]]:
         if word.startswith(('ب', 'ل', 'ك')):
             clean_word = word[1:]
         
-        clean_word = re.sub(r'[^\w\s]', '', clean_word)
-        
-        if clean_word in number_words:
-            amounts.append((number_words[clean_word], current_pos))
+        # Number words are all word characters, so punctuation only needs
+        # stripping from a word that misses and isn't already all letters/digits
+        value = _NUMBER_WORDS.get(clean_word)
+        if value is None and not clean_word.isalnum():
+            value = _NUMBER_WORDS.get(_NON_WORD_RE.sub('', clean_word))
+        if value is not None:
+            amounts.append((value, current_pos))
         
         current_pos += len(word) + 1
     
     # Extract digit patterns with enhanced currency detection
-    from app.config import CURRENCY_PATTERNS
-    
-    for pattern in CURRENCY_PATTERNS:
-        for match in re.finditer(pattern, text_lower):
-            try:
-                amount_str = match.group(1).replace(',', '').replace('٫', '.').strip()
-                if amount_str:
-                    amount = float(amount_str)
-                    if amount > 0:
-                        amounts.append((amount, match.start()))
-            except (ValueError, IndexError):
-                continue
+    for match in CURRENCY_RE.finditer(text_lower):
+        try:
+            amount_str = next(g for g in match.groups() if g)
+            amount_str = amount_str.replace(',', '').replace('٫', '.').strip()
+            if amount_str:
+                amount = float(amount_str)
+                if amount > 0:
+                    amounts.append((amount, match.start()))
+        except (ValueError, StopIteration):
+            continue
     
     # Also look for standalone numbers
-    for match in re.finditer(r'(\d+(?:[,.]?\d+)?)', text_lower):
+    for match in _STANDALONE_NUMBER_RE.finditer(text_lower):
         try:
             amount_str = match.group(1).replace(',', '').strip()
             if amount_str:
@@ -128,40 +137,42 @@ def extract_amounts_from_text(text: str) -> List[Tuple[float, int]]:
     
     # Remove duplicates by position and sort
     unique_amounts = []
-    seen_positions = set()
+    last_position_key = -1
     
-    for amount, pos in sorted(amounts, key=lambda x: x[1]):
+    # Sorted by position, so equal buckets are adjacent and only the last needs remembering
+    for amount, pos in sorted(amounts, key=itemgetter(1)):
         # Allow some tolerance for position matching
         position_key = pos // 5  # Group positions within 5 characters
-        if position_key not in seen_positions:
-            seen_positions.add(position_key)
+        if position_key != last_position_key:
+            last_position_key = position_key
             unique_amounts.append((amount, pos))
     
     logger.debug(f"Extracted {len(unique_amounts)} amounts: {[a[0] for a in unique_amounts]}")
     return unique_amounts
 
 
+# Segment splitting patterns
+_SPLIT_PATTERNS = [
+    r'وبعدين\s*',  # وبعدين
+    r'و\s*(?=جبت|رحت|ركبت|كلت|اشتريت|دفعت|شريت)',  # و before action verbs
+    r'بعد\s*كده\s*',  # بعد كده
+    r'وكمان\s*',  # وكمان
+    r'ثم\s*',  # ثم
+    r'بعدها\s*',  # بعدها
+]
+_SPLIT_RE = re.compile('|'.join(f'({p})' for p in _SPLIT_PATTERNS), re.IGNORECASE)
+_CONNECTOR_RE = re.compile(r'^(وبعدين|و|بعد\s*كده|وكمان|ثم|بعدها)\s*$', re.IGNORECASE)
+_POUND_AMOUNT_RE = re.compile(r'\d+\s*جنيه')
+
+
 def split_text_into_segments(text: str) -> List[str]:
     """Split text into transaction segments"""
-    # Enhanced splitting patterns
-    patterns = [
-        r'وبعدين\s*',  # وبعدين
-        r'و\s*(?=جبت|رحت|ركبت|كلت|اشتريت|دفعت|شريت)',  # و before action verbs
-        r'بعد\s*كده\s*',  # بعد كده
-        r'وكمان\s*',  # وكمان
-        r'ثم\s*',  # ثم
-        r'بعدها\s*',  # بعدها
-    ]
-    
-    # Combine all patterns
-    combined_pattern = '|'.join(f'({p})' for p in patterns)
-    
-    segments = re.split(combined_pattern, text, flags=re.IGNORECASE)
+    segments = _SPLIT_RE.split(text)
     
     # Clean segments and remove empty ones
     transactions = []
     for segment in segments:
-        if segment and not re.match(r'^(وبعدين|و|بعد\s*كده|وكمان|ثم|بعدها)\s*$', segment.strip(), re.IGNORECASE):
+        if segment and not _CONNECTOR_RE.match(segment.strip()):
             segment = segment.strip()
             if segment and len(segment) > 5:  # Ignore very short segments
                 transactions.append(segment)
@@ -170,7 +181,7 @@ def split_text_into_segments(text: str) -> List[str]:
     if len(transactions) <= 1:
         # Look for amount patterns to split
         amount_positions = []
-        for match in re.finditer(r'\d+\s*جنيه', text):
+        for match in _POUND_AMOUNT_RE.finditer(text):
             amount_positions.append(match.end())
         
         if len(amount_positions) > 1:
@@ -192,14 +203,18 @@ def split_text_into_segments(text: str) -> List[str]:
     return transactions
 
 
+# Runs of Arabic-block characters (U+0600-U+06FF)
+_ARABIC_RUN_RE = re.compile('[\u0600-\u06FF]+')
+
+
 def detect_language(text: str) -> str:
     """Simple language detection for Arabic/English"""
     if not text:
         return "unknown"
     
-    # Count Arabic characters
-    arabic_chars = sum(1 for char in text if '\u0600' <= char <= '\u06FF')
-    total_chars = len([char for char in text if char.isalpha()])
+    # Count Arabic characters a run at a time, and letters without a Python loop
+    arabic_chars = sum(map(len, _ARABIC_RUN_RE.findall(text)))
+    total_chars = sum(map(str.isalpha, text))
     
     if total_chars == 0:
         return "unknown"
@@ -1,18 +1,63 @@
+from typing import Iterable, List
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from models import Transaction
 
-def save_transaction(db: Session, data: dict):
-    t = Transaction(
-        amount=data["amount"],
-        category=data["category"],
-        date=data["date"],
-        description=data["description"]
-    )
-    db.add(t)
+def _transaction_values(rows: Iterable[dict]) -> List[dict]:
+    return [
+        {
+            "amount": data["amount"],
+            "category": data["category"],
+            "date": data["date"],
+            "description": data["description"]
+        }
+        for data in rows
+    ]
+
+
+def save_transactions(db: Session, rows: Iterable[dict]) -> List[Transaction]:
+    # ORM bulk insert: one multi-row INSERT ... RETURNING and one commit for
+    # the whole batch instead of a round trip and a commit per row
+    values = _transaction_values(rows)
+    if not values:
+        return []
+    objs = db.scalars(insert(Transaction).returning(Transaction), values).all()
     db.commit()
-    db.refresh(t)
-    return t
+    return list(objs)
+
+
+async def save_transactions_async(db: AsyncSession,
+                                  rows: Iterable[dict]) -> List[Transaction]:
+    values = _transaction_values(rows)
+    if not values:
+        return []
+    objs = (await db.scalars(insert(Transaction).returning(Transaction), values)).all()
+    await db.commit()
+    return list(objs)
+
+
+def save_transaction(db: Session, data: dict):
+    return save_transactions(db, [data])[0]
 
 
 def get_all_transactions(db: Session):
     return db.query(Transaction).all()
+
+
+def iter_transactions(db: Session, batch_size: int = 1000) -> Iterable[Transaction]:
+    # Streams the table in batches instead of building every ORM object up front
+    return db.query(Transaction).yield_per(batch_size)
+
+
+def get_all_transactions_core(db: Session):
+    # Plain Row tuples for serialization; skips ORM object construction
+    return db.execute(
+        select(
+            Transaction.id,
+            Transaction.amount,
+            Transaction.category,
+            Transaction.date,
+            Transaction.description
+        )
+    ).all()
@@ -1,7 +1,11 @@
+import os
 from sqlalchemy import create_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 DATABASE_URL = "sqlite:///./transactions.db"
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "sqlite+aiosqlite:///./transactions.db")
 
 engine = create_engine(
     DATABASE_URL,
@@ -14,4 +18,29 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+# Used from the async request handlers so DB I/O never blocks the event loop.
+# aiosqlite defaults to NullPool (a new connection per session), so the pool is
+# explicit. SQLite allows one writer at a time, so a few connections are
+# enough; the larger pool (one worker's in-flight requests plus headroom)
+# only applies when ASYNC_DATABASE_URL points at a server database
+if ASYNC_DATABASE_URL.startswith("sqlite"):
+    POOL_SIZE, MAX_OVERFLOW = 5, 5
+else:
+    POOL_SIZE, MAX_OVERFLOW = 20, 40
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_pre_ping=True,
+    pool_recycle=1800
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 Base = declarative_base()
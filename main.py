@@ -1,16 +1,39 @@
 import os
 import io
+import re
 import json
+import time
+import hashlib
+import functools
+import wave
+import struct
+import asyncio
 import tempfile
 import platform
+import datetime
+import logging
+import httpx
+import orjson
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from fastapi import FastAPI, UploadFile, File, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from typing import Annotated, Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field, StringConstraints
 from pydub import AudioSegment
-from groq import Groq
+from groq import AsyncGroq, DefaultAsyncHttpxClient
+import crud
+from database import Base, AsyncSessionLocal, async_engine
+
+# HTTP/2 multiplexes concurrent Groq calls over one connection when h2 is installed
+try:
+    import h2  # noqa: F401
+    HAS_H2 = True
+except ImportError:
+    HAS_H2 = False
 
 # ---------- Load ENV ----------
 load_dotenv()
@@ -20,7 +43,17 @@ if not GROQ_KEY:
     print("Warning: GROQ_API_KEY missing - some features may not work")
     groq_client = None
 else:
-    groq_client = Groq(api_key=GROQ_KEY)
+    # One async client for the whole app: its httpx pool keeps connections
+    # to Groq alive between requests, and calls don't block the event loop.
+    # The SDK default pool (100 connections, 20 kept alive) is too small for
+    # batch fan-out, so handshakes would return under load
+    groq_client = AsyncGroq(
+        api_key=GROQ_KEY,
+        http_client=DefaultAsyncHttpxClient(
+            http2=HAS_H2,
+            limits=httpx.Limits(max_connections=1000, max_keepalive_connections=500),
+        ),
+    )
 
 # ---------- Setup FFmpeg (Cross-platform) ----------
 if platform.system() == "Windows":
@@ -30,8 +63,243 @@ else:
     AudioSegment.converter = "ffmpeg"
     AudioSegment.ffprobe = "ffprobe"
 
-# ---------- App ----------
-app = FastAPI(title="Voice & Text Finance Analyzer")
+# Containers whose index may follow the audio data; ffmpeg needs to seek
+# in these, so they go through a temp file instead of a pipe
+SEEKABLE_FORMATS = {".m4a", ".mp4", ".mov", ".3gp"}
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Long recordings are cut at pauses into pieces Whisper transcribes in
+# parallel; a pause is 0.4 s below -35 dB
+SEGMENT_SECONDS = 25
+PCM_BYTES_PER_SECOND = 16000 * 2
+SILENCE_FILTER = "silencedetect=noise=-35dB:d=0.4"
+_SILENCE_RE = re.compile(rb"silence_(start|end): (-?[\d.]+)")
+
+# Set RESAMPLE_AUDIO=0 when clients already send 16 kHz mono audio; uploads
+# then go to Whisper as-is and ffmpeg is never spawned. 16 kHz mono PCM WAV
+# skips ffmpeg either way
+RESAMPLE_AUDIO = os.getenv("RESAMPLE_AUDIO", "1") == "1"
+
+
+async def is_whisper_ready_wav(file: UploadFile) -> bool:
+    """Check the WAV header for 16 kHz mono 16-bit PCM, rewinding the upload"""
+    header = await file.read(36)
+    await file.seek(0)
+    if len(header) < 36 or header[:4] != b"RIFF" or header[8:16] != b"WAVEfmt ":
+        return False
+    # Canonical layout: the fmt chunk directly follows the RIFF header; any
+    # other layout just takes the ffmpeg path
+    audio_format, channels, sample_rate = struct.unpack("<HHI", header[20:28])
+    bits_per_sample, = struct.unpack("<H", header[34:36])
+    return (audio_format, channels, sample_rate, bits_per_sample) == (1, 1, 16000, 16)
+
+
+async def transcode_to_pcm(file: UploadFile) -> Tuple[bytes, List[Tuple[float, float]]]:
+    """
+    Convert an upload to 16 kHz mono 16-bit PCM, streaming it through ffmpeg
+
+    The same pass runs silencedetect, so the (start, end) seconds of every
+    pause come back with the samples at no extra decode cost.
+    """
+    suffix = os.path.splitext(file.filename)[1].lower()
+    tmp_path = None
+    try:
+        if suffix in SEEKABLE_FORMATS:
+            # Name recorded before writing so a failed spool is still removed
+            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+                tmp_path = tmp.name
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    await asyncio.to_thread(tmp.write, chunk)
+
+        proc = await asyncio.create_subprocess_exec(
+            AudioSegment.converter, "-hide_banner", "-nostats", "-v", "info",
+            "-i", tmp_path or "pipe:0", "-af", SILENCE_FILTER,
+            "-ac", "1", "-ar", "16000", "-f", "s16le", "-acodec", "pcm_s16le", "pipe:1",
+            stdin=asyncio.subprocess.DEVNULL if tmp_path else asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+
+        async def feed_upload():
+            try:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    proc.stdin.write(chunk)
+                    await proc.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # ffmpeg exited early; its stderr says why
+            finally:
+                proc.stdin.close()
+
+        jobs = [proc.stdout.read(), proc.stderr.read()]
+        if not tmp_path:
+            jobs.append(feed_upload())
+        try:
+            pcm, stderr, *_ = await asyncio.gather(*jobs)
+        except BaseException:
+            # Cancelled or failed mid-stream: don't leave ffmpeg running
+            if proc.returncode is None:
+                proc.kill()
+            await proc.wait()
+            raise
+        await proc.wait()
+    finally:
+        if tmp_path:
+            os.remove(tmp_path)
+
+    if proc.returncode != 0:
+        # Info-level output precedes the error; its last lines say what failed
+        reason = "\n".join(stderr.decode(errors="replace").strip().splitlines()[-3:])
+        raise RuntimeError(f"ffmpeg failed: {reason}")
+
+    silences = []
+    start = None
+    for kind, seconds in _SILENCE_RE.findall(stderr):
+        if kind == b"start":
+            start = max(float(seconds), 0.0)
+        elif start is not None:
+            silences.append((start, float(seconds)))
+            start = None
+    if start is not None:
+        silences.append((start, len(pcm) / PCM_BYTES_PER_SECOND))
+    return pcm, silences
+
+
+def split_pcm(pcm: bytes, silences: List[Tuple[float, float]]) -> List[bytes]:
+    """Cut PCM into pieces of at most SEGMENT_SECONDS, in the middle of pauses"""
+    duration = len(pcm) / PCM_BYTES_PER_SECOND
+    pauses = [(start + end) / 2 for start, end in silences]
+    cuts = []
+    position = 0.0
+    while duration - position > SEGMENT_SECONDS:
+        limit = position + SEGMENT_SECONDS
+        # Latest pause that keeps the piece under the limit, else a hard cut
+        cut = next((p for p in reversed(pauses) if position < p <= limit), limit)
+        cuts.append(cut)
+        position = cut
+    # Cut on whole samples
+    offsets = [0] + [int(cut * 16000) * 2 for cut in cuts] + [len(pcm)]
+    return [pcm[a:b] for a, b in zip(offsets, offsets[1:])]
+
+
+def pcm_to_wav(pcm: bytes) -> io.BytesIO:
+    """Wrap 16 kHz mono 16-bit PCM in a WAV header"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(pcm)
+    buffer.seek(0)
+    buffer.name = "voice.wav"
+    return buffer
+
+# ---------- Transaction Writer ----------
+# Analyses are queued and written in batches of up to WRITE_BATCH_SIZE rows,
+# each gathered for at most WRITE_BATCH_WAIT seconds, so requests never wait
+# on a commit. Created per event loop in lifespan; None means no writer runs.
+# The queue is bounded so a stalled database slows requests down instead of
+# growing memory without limit
+WRITE_BATCH_SIZE = 512
+WRITE_BATCH_WAIT = 0.05
+WRITE_QUEUE_SIZE = 10000
+logger = logging.getLogger(__name__)
+insert_queue: Optional[asyncio.Queue] = None
+_tables_created = False
+
+
+async def create_tables():
+    """Create the model tables once per process"""
+    global _tables_created
+    if not _tables_created:
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        _tables_created = True
+
+
+async def transaction_writer(queue: asyncio.Queue):
+    """Flush queued rows in batches until a None sentinel arrives"""
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        row = await queue.get()
+        if row is None:
+            break
+        rows = [row]
+        deadline = loop.time() + WRITE_BATCH_WAIT
+        while len(rows) < WRITE_BATCH_SIZE:
+            try:
+                row = await asyncio.wait_for(queue.get(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+            if row is None:
+                stopping = True
+                break
+            rows.append(row)
+
+        await write_rows(rows)
+
+
+async def write_rows(rows: List[dict]):
+    """Write a batch, retrying row by row so one bad row doesn't drop the rest"""
+    try:
+        async with AsyncSessionLocal() as db:
+            await crud.save_transactions_async(db, rows)
+        return
+    except Exception:
+        if len(rows) == 1:
+            logger.exception("Transaction write failed, row dropped: %r", rows[0])
+            return
+        logger.warning("Batch write of %d rows failed, retrying one by one", len(rows))
+    for row in rows:
+        await write_rows([row])
+
+
+def iter_nowait(queue: asyncio.Queue):
+    """Drain whatever is in the queue without waiting"""
+    while not queue.empty():
+        yield queue.get_nowait()
+
+
+async def save_transaction_later(row: dict):
+    """Queue a row for the writer, or write it now when no writer is running"""
+    if insert_queue is not None:
+        await insert_queue.put(row)
+        return
+    try:
+        await create_tables()
+        async with AsyncSessionLocal() as db:
+            await crud.save_transactions_async(db, [row])
+    except Exception:
+        # The analysis is still returned; only the stored copy is lost
+        logger.exception("Transaction write failed, row dropped: %r", row)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global insert_queue
+    await create_tables()
+    insert_queue = asyncio.Queue(maxsize=WRITE_QUEUE_SIZE)
+    writer = asyncio.create_task(transaction_writer(insert_queue))
+    yield
+    # Flush what is queued before the engine goes away. The queue stays in
+    # place until the writer is done; rows queued behind the sentinel by
+    # requests still finishing are written directly afterwards
+    queue = insert_queue
+    await queue.put(None)
+    await writer
+    insert_queue = None
+    leftover = [row for row in iter_nowait(queue) if row is not None]
+    if leftover:
+        await write_rows(leftover)
+    if groq_client is not None:
+        await groq_client.close()
+    await async_engine.dispose()
+
+app = FastAPI(
+    title="Voice & Text Finance Analyzer",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
 
 # ---------- CORS ----------
 app.add_middleware(
@@ -46,12 +314,12 @@ templates = Jinja2Templates(directory="templates")
 
 # ---------- Home ----------
 @app.get("/", response_class=HTMLResponse)
-def home(request: Request):
+async def home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 # ---------- Health Check ----------
 @app.get("/health")
-def health_check():
+async def health_check():
     return {
         "status": "healthy",
         "groq_configured": groq_client is not None,
@@ -59,8 +327,14 @@ def health_check():
     }
 
 # ---------- Text Input ----------
+# Rejected with a 422 while parsing the body, before any Groq call is paid for
+FinanceText = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=1000)]
+
 class TextInput(BaseModel):
-    text: str
+    text: FinanceText
+
+class BatchInput(BaseModel):
+    texts: List[FinanceText] = Field(..., min_length=1, max_length=100)
 
 # ---------- Finance Prompt ----------
 FINANCE_PROMPT = """
@@ -85,25 +359,114 @@ Sentence:
 "{text}"
 """
 
+# The JSON schema above is full of literal braces, so the template is split
+# once here and the sentence spliced in, instead of str.format per call
+_PROMPT_PREFIX, _PROMPT_SUFFIX = FINANCE_PROMPT.split('"{text}"')
+
+
+def build_finance_prompt(text: str) -> str:
+    """FINANCE_PROMPT with the sentence quoted in"""
+    return _PROMPT_PREFIX + '"' + text.replace('"', '\\"') + '"' + _PROMPT_SUFFIX
+
+# JSON mode makes the reply a bare object, which orjson decodes directly;
+# raw_decode is the fallback for replies wrapped in stray prose
+_JSON_DECODER = json.JSONDecoder()
+
+
+def parse_llm_json(output: str) -> dict:
+    """Decode the first JSON object in a model reply"""
+    try:
+        return orjson.loads(output)
+    except orjson.JSONDecodeError:
+        parsed, _ = _JSON_DECODER.raw_decode(output, max(output.find("{"), 0))
+        return parsed
+
+# ---------- Analysis Cache ----------
+# Parsed analyses of recent sentences, keyed on the case- and
+# whitespace-normalized text; temperature=0 makes repeats deterministic,
+# so a hit skips the Groq round trip. Per process: each worker has its own
+ANALYSIS_CACHE_SIZE = 4096
+ANALYSIS_CACHE_TTL = 3600
+_analysis_cache: "OrderedDict[bytes, tuple]" = OrderedDict()
+
+
+def analysis_cache_key(text: str) -> bytes:
+    """Digest of the text with case and spacing differences removed"""
+    normalized = " ".join(text.lower().split())
+    return hashlib.blake2b(normalized.encode(), digest_size=16).digest()
+
+
+# Groq calls in flight, by cache key: concurrent requests for the same
+# sentence wait on one call instead of each paying for their own
+_analysis_inflight: "dict[bytes, asyncio.Task]" = {}
+
+
+async def request_analysis(text: str) -> dict:
+    """One Groq chat completion for the finance prompt"""
+    prompt = build_finance_prompt(text)
+
+    response = await groq_client.chat.completions.create(
+        model="llama-3.3-70b-versatile",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0,
+        response_format={"type": "json_object"}
+    )
+
+    return parse_llm_json(response.choices[0].message.content)
+
+
+def _finish_analysis(key: bytes, task: asyncio.Task):
+    _analysis_inflight.pop(key, None)
+    # Checking exception() also marks it retrieved if every waiter is gone
+    if task.cancelled() or task.exception() is not None:
+        return
+    _analysis_cache[key] = (time.monotonic() + ANALYSIS_CACHE_TTL, task.result())
+    _analysis_cache.move_to_end(key)
+    if len(_analysis_cache) > ANALYSIS_CACHE_SIZE:
+        _analysis_cache.popitem(last=False)
+
+
+async def analyze_finance_text(text: str) -> dict:
+    """Run the finance prompt on text, reusing a cached or in-flight analysis"""
+    key = analysis_cache_key(text)
+    entry = _analysis_cache.get(key)
+    if entry is not None and entry[0] > time.monotonic():
+        _analysis_cache.move_to_end(key)
+        return entry[1]
+
+    task = _analysis_inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(request_analysis(text))
+        _analysis_inflight[key] = task
+        task.add_done_callback(functools.partial(_finish_analysis, key))
+
+    # Shielded so one client disconnecting doesn't cancel the others' call
+    return await asyncio.shield(task)
+
+def transaction_row(text: str, analysis: dict) -> dict:
+    """Transaction columns for an analyzed sentence, coerced to the column types"""
+    try:
+        amount = float(analysis.get("amount"))
+    except (TypeError, ValueError):
+        amount = None
+    category = analysis.get("category")
+    return {
+        "amount": amount,
+        "category": None if category is None else str(category),
+        "date": str(analysis.get("date") or datetime.date.today().isoformat()),
+        "description": text
+    }
+
 # ---------- Text Analyze ----------
 @app.post("/analyze")
-def analyze_text(input: TextInput):
+async def analyze_text(input: TextInput):
     try:
         if not groq_client:
             raise HTTPException(status_code=503, detail="GROQ API not configured")
             
-        prompt = FINANCE_PROMPT.format(text=input.text)
+        parsed = await analyze_finance_text(input.text)
 
-        response = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0
-        )
-
-        output = response.choices[0].message.content
-        start = output.find("{")
-        end = output.rfind("}")
-        parsed = json.loads(output[start:end+1])
+        await save_transaction_later(transaction_row(input.text, parsed))
 
         return {"analysis": parsed}
 
@@ -111,55 +474,105 @@ def analyze_text(input: TextInput):
         print("Text analyze error:", e)
         raise HTTPException(status_code=500, detail=str(e))
 
-# ---------- Voice Analyze ----------
-@app.post("/voice")
-async def analyze_voice(file: UploadFile = File(...)):
+# ---------- Batch Analyze ----------
+# Groq calls in flight at once for one batch request
+BATCH_CONCURRENCY = 32
+
+@app.post("/analyze/batch")
+async def analyze_batch(input: BatchInput):
     try:
         if not groq_client:
             raise HTTPException(status_code=503, detail="GROQ API not configured")
-            
-        if not file.filename:
-            raise HTTPException(status_code=400, detail="Empty file")
 
-        suffix = os.path.splitext(file.filename)[1]
+        # Sentences that normalize to the same cache key share one call
+        unique: Dict[str, str] = {}
+        for text in input.texts:
+            unique.setdefault(analysis_cache_key(text), text)
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp.write(await file.read())
-            tmp_path = tmp.name
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
 
-        audio = AudioSegment.from_file(tmp_path)
-        audio = audio.set_channels(1).set_frame_rate(16000)
+        async def analyze_one(text: str) -> dict:
+            async with semaphore:
+                return await analyze_finance_text(text)
 
-        wav_tmp = tmp_path + ".wav"
-        audio.export(wav_tmp, format="wav")
-
-        with open(wav_tmp, "rb") as f:
-            buffer = io.BytesIO(f.read())
-            buffer.name = "voice.wav"
-
-        transcript = groq_client.audio.transcriptions.create(
-            model="whisper-large-v3-turbo",
-            file=buffer,
-            language="ar"
+        # One failed sentence is reported in its slot instead of failing the batch
+        results = await asyncio.gather(
+            *(analyze_one(t) for t in unique.values()), return_exceptions=True
         )
+        by_key: Dict[str, dict] = {}
+        for key, result in zip(unique, results):
+            if isinstance(result, Exception):
+                # Groq errors can carry internals; the client gets a generic message
+                logger.warning("Batch analyze item failed", exc_info=result)
+                result = {"error": "Analysis failed"}
+            by_key[key] = result
+
+        return {"analyses": [by_key[analysis_cache_key(t)] for t in input.texts]}
+
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Batch analyze failed")
+        raise HTTPException(status_code=500, detail="Batch analysis failed")
+
+# ---------- Transcript Cache ----------
+# Transcripts of recent uploads by content digest: a re-submitted voice note
+# skips ffmpeg and Whisper, and its transcript then hits the analysis cache
+TRANSCRIPT_CACHE_SIZE = 2048
+_transcript_cache: "OrderedDict[bytes, str]" = OrderedDict()
+
+
+async def upload_digest(file: UploadFile) -> bytes:
+    """blake2b of the upload's bytes, rewinding it afterwards"""
+    # The upload is already spooled locally, so this is a local re-read
+    hasher = hashlib.blake2b(digest_size=16)
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        hasher.update(chunk)
+    await file.seek(0)
+    return hasher.digest()
+
+async def transcribe(audio) -> str:
+    """Whisper transcript of one audio file"""
+    transcript = await groq_client.audio.transcriptions.create(
+        model="whisper-large-v3-turbo",
+        file=audio,
+        language="ar"
+    )
+    return transcript.text
 
-        text = transcript.text
-
-        prompt = FINANCE_PROMPT.format(text=text)
-
-        response = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0
-        )
-
-        output = response.choices[0].message.content
-        start = output.find("{")
-        end = output.rfind("}")
-        parsed = json.loads(output[start:end+1])
+# ---------- Voice Analyze ----------
+@app.post("/voice")
+async def analyze_voice(file: UploadFile = File(...)):
+    try:
+        if not groq_client:
+            raise HTTPException(status_code=503, detail="GROQ API not configured")
+            
+        if not file.filename:
+            raise HTTPException(status_code=400, detail="Empty file")
 
-        os.remove(tmp_path)
-        os.remove(wav_tmp)
+        audio_key = await upload_digest(file)
+        text = _transcript_cache.get(audio_key)
+        if text is not None:
+            _transcript_cache.move_to_end(audio_key)
+        else:
+            if RESAMPLE_AUDIO and not await is_whisper_ready_wav(file):
+                pcm, silences = await transcode_to_pcm(file)
+                segments = split_pcm(pcm, silences)
+                texts = await asyncio.gather(
+                    *(transcribe(pcm_to_wav(segment)) for segment in segments)
+                )
+                text = texts[0] if len(texts) == 1 else " ".join(
+                    t.strip() for t in texts if t.strip()
+                )
+            else:
+                # The spooled upload itself; httpx streams it in chunks, so
+                # it is never copied into one bytes object
+                text = await transcribe((file.filename, file.file))
+            _transcript_cache[audio_key] = text
+            if len(_transcript_cache) > TRANSCRIPT_CACHE_SIZE:
+                _transcript_cache.popitem(last=False)
+
+        parsed = await analyze_finance_text(text)
 
         return {
             "text": text,
@@ -174,4 +587,15 @@ async def analyze_voice(file: UploadFile = File(...)):
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run("main:app", host="0.0.0.0", port=port)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        # uvloop where installed (not on Windows), httptools for HTTP parsing
+        loop="auto",
+        http="httptools",
+        workers=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        # Shed load with 503s past this many connections per worker
+        limit_concurrency=1024,
+        backlog=2048
+    )
@@ -0,0 +1,129 @@
+"""
+Unit tests for the extraction cache
+"""
+import asyncio
+
+import pytest
+
+import ai_model
+from ai_model import ExtractionCache
+
+DATA = {"amount": 20.0, "category": "Food", "date": "today", "description": "coffee"}
+
+
+def test_exact_tier_hit_and_copy():
+    """Exact hits match normalized text and return a copy"""
+    cache = ExtractionCache(max_size=4, ttl=60)
+    cache.set(ExtractionCache.key_for("Coffee 20"), DATA)
+    hit = cache.get_exact(ExtractionCache.key_for("  coffee   20 "))
+    assert hit == DATA
+    hit["amount"] = 0
+    assert cache.get_exact(ExtractionCache.key_for("coffee 20"))["amount"] == 20.0
+
+
+def test_exact_tier_expires_and_evicts():
+    """Entries expire after the TTL and the oldest is evicted past max_size"""
+    cache = ExtractionCache(max_size=2, ttl=-1)
+    cache.set("a", DATA)
+    assert cache.get_exact("a") is None
+
+    cache = ExtractionCache(max_size=2, ttl=60)
+    for key in "abc":
+        cache.set(key, DATA)
+    assert cache.get_exact("a") is None
+    assert cache.get_exact("c") == DATA
+
+
+def _lookup(cache, text, query, stored):
+    """get_semantic after embedding the pending entries from stored (text -> vector)"""
+    pending = cache.pending_embeddings(text) or []
+    embedded = [(i, entry, stored[entry.text]) for i, entry in pending]
+    return cache.get_semantic(text, query, embedded)
+
+
+def test_semantic_tier_matches_similar_embedding():
+    """A close embedding with the same numbers is a hit"""
+    cache = ExtractionCache(max_size=4, ttl=60, threshold=0.95)
+    cache.set("k", DATA, "coffee 20")
+    assert [entry.text for _, entry in cache.pending_embeddings("a coffee for 20")] == ["coffee 20"]
+    assert _lookup(cache, "a coffee for 20", [0.99, 0.05, 0.0], {"coffee 20": [1.0, 0.0, 0.0]}) == DATA
+    # The entry's vector is kept, so it is not embedded again
+    assert cache.pending_embeddings("a coffee for 20") == []
+    assert cache.get_semantic("a coffee for 20", [0.0, 1.0, 0.0]) is None
+
+
+def test_semantic_tier_requires_same_numbers():
+    """Different amounts never share an entry"""
+    cache = ExtractionCache(max_size=4, ttl=60)
+    cache.set("k", DATA, "coffee 20", [1.0, 0.0])
+    assert cache.pending_embeddings("coffee 25") is None
+    assert cache.get_semantic("coffee 25", [1.0, 0.0]) is None
+
+
+def test_semantic_tier_ignores_reused_slot():
+    """An embedding fetched for an overwritten slot is dropped"""
+    cache = ExtractionCache(max_size=1, ttl=60)
+    cache.set("a", DATA, "tea 1")
+    pending = cache.pending_embeddings("green tea 1")
+    cache.set("b", DATA, "tea 1")
+    embedded = [(i, entry, [1.0, 0.0]) for i, entry in pending]
+    assert cache.get_semantic("green tea 1", [1.0, 0.0], embedded) is None
+    assert len(cache.pending_embeddings("green tea 1")) == 1
+
+
+def test_semantic_tier_ring_overwrites_oldest():
+    """The semantic tier keeps only the newest max_size entries"""
+    cache = ExtractionCache(max_size=2, ttl=60)
+    cache.set("a", DATA, "tea 1")
+    cache.set("b", DATA, "tea 2")
+    cache.set("c", DATA, "tea 3")
+    assert cache.pending_embeddings("tea 1") is None
+    assert cache.pending_embeddings("tea 3") is not None
+
+
+@pytest.mark.parametrize("has_numpy", [True, False])
+def test_semantic_tier_backends(monkeypatch, has_numpy):
+    """The numpy and pure-Python scans agree"""
+    if has_numpy and not ai_model.HAS_NUMPY:
+        pytest.skip("numpy not installed")
+    monkeypatch.setattr(ai_model, "HAS_NUMPY", has_numpy)
+    cache = ExtractionCache(max_size=4, ttl=60)
+    cache.set("a", {"category": "Food"}, "lunch 50")
+    cache.set("b", {"category": "Transport"}, "taxi 50")
+    stored = {"lunch 50": [1.0, 0.0], "taxi 50": [0.0, 1.0]}
+    assert _lookup(cache, "uber 50", [0.1, 1.0], stored) == {"category": "Transport"}
+
+
+def test_cached_extraction_embeds_only_with_candidates(monkeypatch):
+    """A miss with nothing to compare against makes no embedding call"""
+    calls = []
+
+    async def fake_embed(texts):
+        calls.append(texts)
+        return [[1.0, 0.0] for _ in texts]
+
+    async def fake_extract(text):
+        return dict(DATA)
+
+    monkeypatch.setattr(ai_model, "extraction_cache", ExtractionCache(max_size=4, ttl=60))
+    monkeypatch.setattr(ai_model, "_embed", fake_embed)
+    extract = ai_model.cached_extraction(fake_extract)
+
+    assert asyncio.run(extract("coffee 20")) == DATA
+    assert asyncio.run(extract("coffee 20")) == DATA
+    assert calls == []
+    # Now a candidate with the same numbers exists: one call embeds both texts
+    assert asyncio.run(extract("a coffee 20")) == DATA
+    assert calls == [["a coffee 20", "coffee 20"]]
+
+
+def test_call_openai_extract_normalizes_date_after_cache(monkeypatch):
+    """The raw model date is cached; an empty date resolves to the serving day"""
+    async def fake_cached(text):
+        return {"amount": 1.0, "category": "Other", "date": "", "description": text}
+
+    monkeypatch.setattr(ai_model, "_extract_cached", fake_cached)
+    monkeypatch.setattr(ai_model, "date", type("FakeDate", (ai_model.date,), {
+        "today": classmethod(lambda cls: ai_model.date(2030, 1, 2))}))
+    assert asyncio.run(ai_model.call_openai_extract("x"))["date"] == "2030-01-02"
+
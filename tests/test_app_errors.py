@@ -0,0 +1,51 @@
+"""
+Unit tests for error responses from the app package
+"""
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+# app.config reads these at import; any value will do for the error paths
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ASSEMBLYAI_API_KEY", "test-key")
+
+from app.api import endpoints  # noqa: E402
+from app.exceptions import NLPProcessingError  # noqa: E402
+from app.main import app  # noqa: E402
+
+client = TestClient(app, raise_server_exceptions=False)
+
+
+@pytest.fixture
+def failing_nlp(monkeypatch):
+    def install(error):
+        async def analyze_text(*args, **kwargs):
+            raise error
+
+        monkeypatch.setattr(endpoints.nlp_service, "analyze_text", analyze_text)
+
+    return install
+
+
+def test_analyze_nlp_failure_keeps_processing_error(failing_nlp):
+    """An NLP failure returns the processing_error code with the request ID"""
+    failing_nlp(NLPProcessingError("model exploded"))
+    response = client.post("/analyze", json={"text": "دفعت 50 جنيه في كارفور"})
+    assert response.status_code == 500
+    assert response.headers["x-request-id"]
+    error = response.json()["error"]
+    assert error["code"] == "processing_error"
+    assert error["message"] == "Failed to analyze text. Please try again."
+
+
+def test_analyze_unexpected_failure_is_internal_error(failing_nlp):
+    """Unexpected errors keep internal_error and the middleware headers"""
+    failing_nlp(RuntimeError("boom"))
+    response = client.post("/analyze", json={"text": "دفعت 50 جنيه في كارفور"})
+    assert response.status_code == 500
+    assert response.headers["x-request-id"]
+    assert response.headers["x-content-type-options"] == "nosniff"
+    error = response.json()["error"]
+    assert error["code"] == "internal_error"
+    assert error["message"] == "An unexpected error occurred"
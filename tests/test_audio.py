@@ -0,0 +1,90 @@
+"""
+Unit tests for the audio splitting helpers
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+
+import pytest
+
+import main
+from main import PCM_BYTES_PER_SECOND, SEGMENT_SECONDS, split_pcm
+
+
+def silent_pcm(seconds):
+    return b"\x00" * int(seconds * PCM_BYTES_PER_SECOND)
+
+
+def durations(pieces):
+    return [len(piece) / PCM_BYTES_PER_SECOND for piece in pieces]
+
+
+def test_short_audio_is_not_split():
+    """Audio under the limit stays one piece"""
+    pcm = silent_pcm(SEGMENT_SECONDS - 1)
+    assert split_pcm(pcm, [(3.0, 4.0)]) == [pcm]
+
+
+def test_cut_lands_in_middle_of_latest_pause():
+    """The cut falls mid-pause, at the last pause before the limit"""
+    pcm = silent_pcm(40)
+    pieces = split_pcm(pcm, [(5.0, 6.0), (20.0, 21.0), (30.0, 31.0)])
+    assert durations(pieces) == [20.5, 19.5]
+    assert b"".join(pieces) == pcm
+
+
+def test_hard_cut_without_pause():
+    """With no pause in range the piece is cut at the limit"""
+    pcm = silent_pcm(60)
+    pieces = split_pcm(pcm, [])
+    assert durations(pieces) == [SEGMENT_SECONDS, SEGMENT_SECONDS, 60 - 2 * SEGMENT_SECONDS]
+
+
+def test_cuts_on_whole_samples():
+    """Offsets stay sample aligned for pauses at odd times"""
+    pcm = silent_pcm(30)
+    pieces = split_pcm(pcm, [(12.00003, 12.00004)])
+    assert all(len(piece) % 2 == 0 for piece in pieces)
+    assert b"".join(pieces) == pcm
+
+
+class FailingUpload:
+    """An upload whose body breaks after the first chunk"""
+
+    def __init__(self, filename, error):
+        self.filename = filename
+        self.error = error
+        self.reads = 0
+
+    async def read(self, size):
+        self.reads += 1
+        if self.reads > 1:
+            raise self.error
+        return b"\x00" * 1024
+
+
+def test_failed_spool_removes_temp_file(monkeypatch, tmp_path):
+    """A seekable upload that fails mid-spool leaves no temp file behind"""
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    with pytest.raises(ConnectionResetError):
+        asyncio.run(main.transcode_to_pcm(
+            FailingUpload("note.m4a", ConnectionResetError("client went away"))))
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.skipif(shutil.which(main.AudioSegment.converter) is None,
+                    reason="ffmpeg not installed")
+def test_failed_stream_kills_ffmpeg(monkeypatch):
+    """An upload error while streaming doesn't leave ffmpeg running"""
+    procs = []
+    spawn = asyncio.create_subprocess_exec
+
+    async def recording_spawn(*args, **kwargs):
+        procs.append(await spawn(*args, **kwargs))
+        return procs[-1]
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", recording_spawn)
+    with pytest.raises(ValueError):
+        asyncio.run(main.transcode_to_pcm(FailingUpload("note.ogg", ValueError("bad body"))))
+    assert procs and procs[0].returncode is not None
@@ -0,0 +1,89 @@
+"""
+Unit tests for the batch analyze endpoint
+"""
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import app
+
+client = TestClient(app)
+
+
+class FakeCompletions:
+    """Stands in for groq_client.chat.completions; amount is the call number"""
+
+    def __init__(self, fail_on=()):
+        self.prompts = []
+        self.fail_on = fail_on
+
+    async def create(self, messages, **kwargs):
+        prompt = messages[0]["content"]
+        self.prompts.append(prompt)
+        if any(text in prompt for text in self.fail_on):
+            raise RuntimeError("model unavailable")
+        content = json.dumps({"amount": len(self.prompts), "category": "Food", "date": None})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def fake_groq(monkeypatch):
+    def install(fail_on=()):
+        completions = FakeCompletions(fail_on)
+        monkeypatch.setattr(main, "groq_client",
+                            SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+        return completions
+
+    main._analysis_cache.clear()
+    yield install
+    main._analysis_cache.clear()
+
+
+def test_batch_duplicates_share_one_call(fake_groq):
+    """Sentences that normalize to the same key are analyzed once"""
+    completions = fake_groq()
+    response = client.post("/analyze/batch",
+                           json={"texts": ["coffee 20", "  Coffee   20 ", "coffee 20"]})
+    assert response.status_code == 200
+    analyses = response.json()["analyses"]
+    assert len(completions.prompts) == 1
+    assert analyses[0] == analyses[1] == analyses[2]
+
+
+def test_batch_results_follow_input_order(fake_groq):
+    """Each analysis lands in the slot of its input sentence"""
+    completions = fake_groq()
+    texts = ["taxi 30", "lunch 45", "taxi 30", "rent 900"]
+    analyses = client.post("/analyze/batch", json={"texts": texts}).json()["analyses"]
+    assert len(completions.prompts) == 3
+    amount_by_text = {}
+    for prompt_index, prompt in enumerate(completions.prompts, start=1):
+        for text in texts:
+            if text in prompt:
+                amount_by_text[text] = prompt_index
+    assert [a["amount"] for a in analyses] == [amount_by_text[t] for t in texts]
+
+
+def test_batch_item_failure_is_reported_in_place(fake_groq):
+    """A failed sentence gets an error entry; the others still succeed"""
+    fake_groq(fail_on=("lunch 45",))
+    analyses = client.post("/analyze/batch",
+                           json={"texts": ["taxi 30", "lunch 45"]}).json()["analyses"]
+    assert "amount" in analyses[0]
+    assert analyses[1] == {"error": "Analysis failed"}
+
+
+def test_batch_without_groq_returns_503(monkeypatch):
+    """A missing API key is a 503, not a 500"""
+    monkeypatch.setattr(main, "groq_client", None)
+    response = client.post("/analyze/batch", json={"texts": ["coffee 20"]})
+    assert response.status_code == 503
+
+
+def test_batch_rejects_empty_list():
+    """An empty batch is a validation error"""
+    response = client.post("/analyze/batch", json={"texts": []})
+    assert response.status_code == 422
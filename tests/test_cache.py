@@ -0,0 +1,130 @@
+"""
+Unit tests for the caching utilities
+"""
+import asyncio
+import os
+
+import pytest
+
+# app.config reads these at import; any value will do for the cache
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ASSEMBLYAI_API_KEY", "test-key")
+
+from app.utils import cache as cache_module  # noqa: E402
+from app.utils.cache import (  # noqa: E402
+    SimpleCache, cache_key_for_text, cached_text_analysis, single_flight
+)
+
+
+def test_simple_cache_get_set_delete():
+    """Values round-trip and can be deleted"""
+    cache = SimpleCache(max_size=10, default_ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.delete("a")
+    assert cache.get("a") is None
+    assert not cache.delete("a")
+
+
+def test_simple_cache_expiry():
+    """Expired entries are not returned and are swept"""
+    cache = SimpleCache(max_size=10, default_ttl=60)
+    cache.set("old", 1, ttl=-1)
+    assert cache.get("old") is None
+
+    cache = SimpleCache(max_size=10, default_ttl=60)
+    cache.sweep_interval = 2
+    cache.set("stale", 1, ttl=-1)
+    cache.set("fresh", 2)
+    assert "stale" not in cache.cache
+    assert cache.stats()["active_entries"] == 1
+
+
+def test_simple_cache_evicts_least_recently_used():
+    """Reading an entry protects it from eviction"""
+    cache = SimpleCache(max_size=2, default_ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_simple_cache_size_estimate_tracks_entries():
+    """The memory estimate drops back to zero as entries go"""
+    cache = SimpleCache(max_size=2, default_ttl=60)
+    for key in "abc":
+        cache.set(key, "value")
+    cache.set("c", "other")
+    assert cache.stats()["memory_usage_estimate"] > 0
+    cache.delete("b")
+    cache.delete("c")
+    assert cache.stats()["memory_usage_estimate"] == 0
+
+
+def test_single_flight_shares_one_computation():
+    """Concurrent callers with one key run compute() once"""
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def scenario():
+        return await asyncio.gather(*(single_flight("k", compute) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["result"] * 5
+    assert len(calls) == 1
+    assert cache_module._inflight == {}
+
+
+def test_single_flight_shares_exceptions():
+    """Waiters see the first caller's exception"""
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def scenario():
+        return await asyncio.gather(*(single_flight("k", compute) for _ in range(3)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+class FakeService:
+    """Minimal method owner for the decorator"""
+
+    def __init__(self):
+        self.calls = []
+
+    @cached_text_analysis(ttl=60)
+    async def analyze(self, text, language="ar"):
+        self.calls.append((text, language))
+        return {"service": id(self), "text": text, "language": language}
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(cache_module, "cache", SimpleCache(max_size=10, default_ttl=60))
+
+
+def test_cached_text_analysis_binds_self(fresh_cache):
+    """The wrapped method receives its own instance and arguments"""
+    service = FakeService()
+    result = asyncio.run(service.analyze("coffee 20", "en"))
+    assert result == {"service": id(service), "text": "coffee 20", "language": "en"}
+    assert service.calls == [("coffee 20", "en")]
+
+
+def test_cached_text_analysis_caches_per_language(fresh_cache):
+    """Repeats hit the cache; a positional or keyword language gives the same key"""
+    service = FakeService()
+    asyncio.run(service.analyze("coffee 20", "en"))
+    asyncio.run(service.analyze("coffee 20", language="en"))
+    asyncio.run(service.analyze("coffee 20"))
+    assert service.calls == [("coffee 20", "en"), ("coffee 20", "ar")]
+    assert cache_module.cache.get(cache_key_for_text("coffee 20", "en")) is not None
@@ -0,0 +1,35 @@
+"""
+Unit tests for the domain models
+"""
+import os
+
+import pytest
+from pydantic import ValidationError
+
+# app.config reads these at import; any value will do for the models
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ASSEMBLYAI_API_KEY", "test-key")
+
+from app.models.domain import Transaction, TransactionType  # noqa: E402
+
+
+def _transaction(amount):
+    return Transaction(
+        id="t1", amount=amount, transaction_type=TransactionType.EXPENSE,
+        category="Food", confidence_score=0.9, extracted_from="50 for food"
+    )
+
+
+def test_negative_amount_is_rejected():
+    """A negative amount never reaches the unvalidated response model"""
+    with pytest.raises(ValidationError):
+        _transaction(-5.0)
+
+
+def test_to_response_detail_copies_fields():
+    """The response detail carries the transaction's values"""
+    detail = _transaction(50.0).to_response_detail()
+    assert detail.amount == 50.0
+    assert detail.currency == "EGP"
+    assert detail.transaction_type == "expense"
+    assert detail.extracted_text == "50 for food"
@@ -0,0 +1,55 @@
+"""
+Unit tests for KeywordMatcher, on both backends
+"""
+import pytest
+
+from app.utils import keyword_matcher
+from app.utils.keyword_matcher import KeywordMatcher
+
+
+@pytest.fixture(params=["ahocorasick", "regex"])
+def backend(request, monkeypatch):
+    if request.param == "ahocorasick" and not keyword_matcher.HAS_AHOCORASICK:
+        pytest.skip("pyahocorasick not installed")
+    monkeypatch.setattr(keyword_matcher, "HAS_AHOCORASICK", request.param == "ahocorasick")
+    return request.param
+
+
+def make_matcher():
+    return KeywordMatcher([
+        ("paid", "expense"), ("Bought", "expense"), ("دفعت", "expense"),
+        ("salary", "income"), ("got", "income"),
+        ("pay", "expense"), ("pay", "verb"),
+    ])
+
+
+def test_finds_tags_and_keywords(backend):
+    """Substring matches report their keyword and tag"""
+    matcher = make_matcher()
+    text = "i paid rent and got my salary"
+    assert matcher.tags(text) == {"expense", "income"}
+    assert {keyword for _, keyword, _ in matcher.iter(text)} == {"paid", "got", "salary"}
+
+
+def test_keywords_are_lowercased(backend):
+    """Keywords are matched lowercased, so callers pass lowercased text"""
+    assert make_matcher().search("bought bread")
+
+
+def test_keyword_with_several_tags(backend):
+    """A keyword carrying two tags reports both"""
+    assert make_matcher().tags("pay now") == {"expense", "verb"}
+
+
+def test_arabic_and_positions(backend):
+    """Arabic keywords match, with start offsets into the text"""
+    matches = sorted(make_matcher().iter("انا دفعت 50"))
+    assert matches == [(4, "دفعت", "expense")]
+
+
+def test_no_match_and_empty_inputs(backend):
+    """Empty texts and empty matchers find nothing"""
+    matcher = make_matcher()
+    assert not matcher.search("nothing here")
+    assert not matcher.search("")
+    assert KeywordMatcher([]).tags("paid") == set()
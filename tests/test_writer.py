@@ -0,0 +1,80 @@
+"""
+Unit tests for the batched transaction writer
+"""
+import asyncio
+import contextlib
+
+import main
+
+
+def make_row(description, amount=1.0):
+    return {"amount": amount, "category": "food", "date": "2024-01-01",
+            "description": description}
+
+
+def run_writer(monkeypatch, rows, fail_on=()):
+    """Feed rows through transaction_writer; return the batches it wrote"""
+    batches = []
+
+    async def fake_save(db, batch):
+        batch = list(batch)
+        if any(row["description"] in fail_on for row in batch):
+            raise ValueError("bad row")
+        batches.append([row["description"] for row in batch])
+
+    monkeypatch.setattr(main, "AsyncSessionLocal", lambda: contextlib.nullcontext())
+    monkeypatch.setattr(main.crud, "save_transactions_async", fake_save)
+
+    async def scenario():
+        queue = asyncio.Queue()
+        for row in rows:
+            queue.put_nowait(row)
+        queue.put_nowait(None)
+        await main.transaction_writer(queue)
+
+    asyncio.run(scenario())
+    return batches
+
+
+def test_writer_batches_queued_rows(monkeypatch):
+    """Rows queued together are written in one batch"""
+    batches = run_writer(monkeypatch, [make_row(str(i)) for i in range(5)])
+    assert batches == [["0", "1", "2", "3", "4"]]
+
+
+def test_writer_respects_batch_size(monkeypatch):
+    """Batches never exceed WRITE_BATCH_SIZE"""
+    monkeypatch.setattr(main, "WRITE_BATCH_SIZE", 2)
+    batches = run_writer(monkeypatch, [make_row(str(i)) for i in range(5)])
+    assert batches == [["0", "1"], ["2", "3"], ["4"]]
+
+
+def test_writer_retries_rows_after_batch_failure(monkeypatch):
+    """A bad row is dropped alone; the rest of its batch is still written"""
+    batches = run_writer(monkeypatch, [make_row(str(i)) for i in range(3)], fail_on={"1"})
+    assert batches == [["0"], ["2"]]
+
+
+def test_transaction_row_coerces_fields():
+    """Model output is coerced to the column types"""
+    row = main.transaction_row("text", {"amount": "12.5", "category": 3, "date": None})
+    assert row["amount"] == 12.5
+    assert row["category"] == "3"
+    assert isinstance(row["date"], str)
+
+    row = main.transaction_row("text", {"amount": "lots", "category": None})
+    assert row["amount"] is None
+    assert row["category"] is None
+
+
+def test_direct_write_failure_is_logged(monkeypatch, caplog):
+    """Without a writer, a failed write is logged instead of raised"""
+    async def failing_save(db, batch):
+        raise ValueError("db down")
+
+    monkeypatch.setattr(main, "insert_queue", None)
+    monkeypatch.setattr(main, "_tables_created", True)
+    monkeypatch.setattr(main, "AsyncSessionLocal", lambda: contextlib.nullcontext())
+    monkeypatch.setattr(main.crud, "save_transactions_async", failing_save)
+    asyncio.run(main.save_transaction_later(make_row("x")))
+    assert "row dropped" in caplog.text